@@ -0,0 +1,300 @@
+__author__ = "Guangjie Guo"
+__organization__ = "COSC343/AIML402, University of Otago"
+__email__ = "guo_guangjie@163.com"
+
+import os
+import sys
+import json
+import threading
+import subprocess
+import concurrent.futures
+import numpy as np
+
+# Protocol between the engine and an agent worker process: one JSON object per line, requests on the worker's
+# stdin and responses on its stdout (anything the agent prints goes to stderr).  A request is
+#
+#    {"id": <int>, "method": <name>, "params": {...}}
+#
+# and its response {"id": <int>, "result": ...} or {"id": <int>, "error": <message>}.  Requests are answered one
+# at a time in the order they were sent, so a client may send several before reading any response.  Methods:
+#
+#    init  - params agent_file, code_length, colours, num_guesses and seed (or null): seeds the random generators,
+#            creates the agent and warms it up (see Player.warm_up), the result is {"init_time": <seconds>}
+#    seed  - params seed: seeds the random generators before a game, the result is null
+#    move  - params percepts, the [guess_counter, last_guess, in_place, in_colour] of AgentFunction: the result is
+#            {"action": <list of colours or null>, "num_candidates": <int or null>}
+
+WORKER_SCRIPT = os.path.abspath(__file__)
+
+
+class AgentTimeout(RuntimeError):
+   """Raised when an agent process doesn't answer a request in time"""
+
+class AgentCrashed(RuntimeError):
+   """Raised when an agent process exits before answering a request"""
+
+
+def to_json(value):
+   """json.dumps default for the numpy values agents return"""
+
+   if isinstance(value, (np.ndarray, np.generic)):
+      return value.tolist()
+   raise TypeError("%s is not JSON serializable" % type(value))
+
+def handle_request(state, method, params):
+   """Carries out a request in the worker process, state holds the player between requests"""
+
+   from mastermind import Player, seed_game
+
+   if method == 'init':
+      if params['seed'] is not None:
+         seed_game(params['seed'])
+      state['player'] = Player(playerFile=params['agent_file'], code_length=params['code_length'],
+                               colours=params['colours'], num_guesses=params['num_guesses'])
+      # The agent's setup counts against the init timeout rather than the first move's
+      state['player'].warm_up()
+      return {'init_time': state['player'].init_time}
+
+   if method == 'seed':
+      seed_game(params['seed'])
+      return None
+
+   if method == 'move':
+      if 'player' not in state:
+         raise RuntimeError("Error! The agent was not created (no init request)")
+      guess_counter, last_guess, in_place, in_colour = params['percepts']
+      if guess_counter == 0:
+         # The engine passes an array of zeros before the first guess
+         last_guess = np.array(last_guess, dtype='uint8')
+      agent = state['player'].agent
+      action = agent.AgentFunction((guess_counter, last_guess, in_place, in_colour))
+      if action is not None and not isinstance(action, (list, np.ndarray)):
+         raise RuntimeError("Error! AgentFunction from '%s' returned a %s (expecting a list or a numpy array)"
+                            % (state['player'].playerFile, type(action)))
+      return {'action': None if action is None else list(action),
+              'num_candidates': getattr(agent, 'num_candidates', None)}
+
+   raise RuntimeError("Error! Unknown method '%s'" % method)
+
+def serve(infile, outfile):
+   """Answers the requests read from infile on outfile until infile is closed"""
+
+   state = {}
+   for line in infile:
+      request = json.loads(line)
+      try:
+         response = {'id': request['id'], 'result': handle_request(state, request['method'], request['params'])}
+      except Exception as e:
+         response = {'id': request['id'], 'error': str(e)}
+      outfile.write(json.dumps(response, default=to_json) + "\n")
+      outfile.flush()
+
+
+class _Connection:
+   """One worker process and the futures of its requests not answered yet"""
+
+   def __init__(self):
+      self.process = subprocess.Popen([sys.executable, WORKER_SCRIPT], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                      text=True, bufsize=1)
+      self.pending = {}
+      self.next_id = 0
+      self.alive = True
+      self.lock = threading.Lock()
+      self.write_lock = threading.Lock()
+      threading.Thread(target=self.read_responses, daemon=True).start()
+
+   def submit(self, method, params):
+      future = concurrent.futures.Future()
+      with self.lock:
+         if not self.alive:
+            future.set_exception(AgentCrashed("Error! The agent process has exited"))
+            return future
+         request_id = self.next_id
+         self.next_id += 1
+         self.pending[request_id] = future
+
+      try:
+         with self.write_lock:
+            self.process.stdin.write(json.dumps({'id': request_id, 'method': method, 'params': params},
+                                                default=to_json) + "\n")
+            self.process.stdin.flush()
+      except OSError:
+         # The reader fails the future when it sees the process exit
+         pass
+      return future
+
+   def read_responses(self):
+      for line in self.process.stdout:
+         response = json.loads(line)
+         with self.lock:
+            future = self.pending.pop(response['id'], None)
+         if future is None:
+            continue
+         if 'error' in response:
+            future.set_exception(RuntimeError(response['error']))
+         else:
+            future.set_result(response['result'])
+
+      with self.lock:
+         self.alive = False
+         pending = list(self.pending.values())
+         self.pending.clear()
+      for future in pending:
+         future.set_exception(AgentCrashed("Error! The agent process exited with code %s" % self.process.wait()))
+
+   def close(self, timeout=1.0):
+      try:
+         self.process.stdin.close()
+         self.process.wait(timeout=timeout)
+      except (OSError, subprocess.TimeoutExpired):
+         self.kill()
+
+   def kill(self):
+      self.process.kill()
+      self.process.wait()
+
+
+class AgentProcess:
+   """
+             An agent running in a worker process of its own, restarted when it crashes or times out
+
+             ...
+
+             Attributes
+             ----------
+             timeout: float
+                 the most seconds to wait for the answer to a move, None to wait for ever
+             restarts : int
+                 the number of times the worker process was restarted
+             init_time : float
+                 the time the agent constructor took in the worker (the last time it was started)
+             num_candidates : int
+                 the num_candidates the agent reported with its last move, if any
+
+             Methods
+             -------
+             AgentFunction(percepts)
+                 Returns the next guess of the agent, like the agent's own AgentFunction
+             seed(game_seed)
+                 Seeds the worker's random generators, without waiting for the worker
+             """
+
+   def __init__(self, agent_file, code_length, colours, num_guesses, seed=None, timeout=None, init_timeout=None):
+      self.init_params = {'agent_file': agent_file, 'code_length': code_length, 'colours': list(colours),
+                          'num_guesses': num_guesses, 'seed': None if seed is None else int(seed)}
+      self.timeout = timeout
+      self.init_timeout = init_timeout
+      self.restarts = 0
+      self.num_candidates = None
+      self.connection = None
+      self.start()
+
+   def start(self):
+      self.connection = _Connection()
+      try:
+         self.init_time = self.connection.submit('init', self.init_params).result(timeout=self.init_timeout)['init_time']
+      except concurrent.futures.TimeoutError:
+         self.connection.kill()
+         raise AgentTimeout("Error! The agent was not created within %g s" % self.init_timeout)
+      except Exception:
+         self.connection.kill()
+         raise
+
+   def restart(self):
+      self.connection.kill()
+      self.restarts += 1
+      self.start()
+
+   def wait(self, future, timeout):
+      """Returns the result of a request, restarting the worker (and raising) if it times out or crashes"""
+
+      try:
+         return future.result(timeout=timeout)
+      except concurrent.futures.TimeoutError:
+         self.restart()
+         raise AgentTimeout("Error! The agent did not answer within %g s" % timeout)
+      except AgentCrashed:
+         self.restart()
+         raise
+
+   def call(self, method, params):
+      return self.wait(self.connection.submit(method, params), self.timeout)
+
+   def seed(self, game_seed):
+      # Pipelined: the answer is not waited for, the next request is answered after it
+      self.connection.submit('seed', {'seed': int(game_seed)})
+
+   def AgentFunction(self, percepts):
+      guess_counter, last_guess, in_place, in_colour = percepts
+      result = self.call('move', {'percepts': [int(guess_counter), last_guess, int(in_place), int(in_colour)]})
+      self.num_candidates = result['num_candidates']
+      return result['action']
+
+   def close(self):
+      self.connection.close()
+
+
+class RemotePlayer:
+   """A Player (see mastermind.py) whose agent is an AgentProcess"""
+
+   def __init__(self, playerFile, code_length, colours, num_guesses, seed=None, timeout=None):
+      if not os.path.exists(playerFile):
+         raise RuntimeError("Error! Agent file '%s' not found" % playerFile)
+      self.playerFile = playerFile
+      self.agent = AgentProcess(playerFile, code_length, colours, num_guesses, seed=seed, timeout=timeout)
+      self.init_time = self.agent.init_time
+
+   def close(self):
+      self.agent.close()
+
+
+class AgentPool:
+   """
+             A pool of worker processes running the same agent, each as a RemotePlayer
+
+             ...
+
+             Attributes
+             ----------
+             players: list of RemotePlayer
+                 a player for each worker process
+
+             Methods
+             -------
+             close()
+                 Shuts the worker processes down
+             """
+
+   def __init__(self, agent_file, code_length, colours, num_guesses, size, seed=None, timeout=None):
+      # The workers start up concurrently, if any of them fails the others are shut down
+      with concurrent.futures.ThreadPoolExecutor(max_workers=size) as executor:
+         futures = [executor.submit(RemotePlayer, agent_file, code_length, colours, num_guesses, seed=seed,
+                                    timeout=timeout) for _ in range(size)]
+      self.players = [future.result() for future in futures if future.exception() is None]
+      for future in futures:
+         if future.exception() is not None:
+            self.close()
+            raise future.exception()
+
+   def close(self):
+      for player in self.players:
+         player.close()
+
+   def __enter__(self):
+      return self
+
+   def __exit__(self, *exc_info):
+      self.close()
+
+
+if __name__ == "__main__":
+
+   # Agents find their modules in the directory the engine runs in
+   sys.path.insert(1, os.getcwd())
+
+   # Keep stdout for the protocol, what the agent prints goes to stderr
+   protocol_out = os.fdopen(os.dup(sys.stdout.fileno()), 'w')
+   os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+   sys.stdout = sys.stderr
+
+   serve(sys.stdin, protocol_out)
@@ -0,0 +1,138 @@
+__author__ = "Guangjie Guo"
+__organization__ = "COSC343/AIML402, University of Otago"
+__email__ = "guo_guangjie@163.com"
+
+import io
+import os
+import sys
+import json
+import time
+import contextlib
+import tracemalloc
+import multiprocessing
+from mastermind import MastermindGame
+from settings import benchmark_settings
+
+# Measurements compared with the baseline by a relative threshold, and the smallest absolute change of each that
+# counts as a regression, so that timer noise on sub-millisecond moves and small allocations is not flagged.  The
+# average score is compared by an absolute threshold of its own
+COMPARED = {'move_p50': 1e-3, 'move_p95': 1e-3, 'init_time': 1e-2, 'peak_memory': 2**20}
+
+
+def config_key(agent_file, code_length, num_colours):
+   return "%s L%d C%d" % (agent_file, code_length, num_colours)
+
+def traced_peak_memory(agent_file, code_length, num_colours, num_guesses, num_games, seed):
+   """Plays the games of a benchmark with tracemalloc tracing and returns the peak memory traced (bytes)"""
+
+   game = MastermindGame(code_length=code_length, num_colours=num_colours)
+   tracemalloc.start()
+   with contextlib.redirect_stdout(io.StringIO()):
+      game.run(agentFile=agent_file, num_guesses=num_guesses, num_games=num_games, seed=seed)
+   _, peak_memory = tracemalloc.get_traced_memory()
+   tracemalloc.stop()
+   return peak_memory
+
+def benchmark_config(agent_file, code_length, num_colours, num_guesses, num_games, seed):
+   """ Plays num_games games of an agent on a board and measures it
+
+         Tracing allocations slows moves down several times, so the games are played twice: once untraced for the
+         score and timings, and once traced for the peak memory, in a fresh process so that it includes setting the
+         agent up as in the untraced run.
+
+         :return: a dictionary with the average score, latency percentiles of all moves, the p95 latency of each
+                  guess number, the agent constructor time and the peak memory traced while playing (bytes)
+   """
+
+   with multiprocessing.get_context('spawn').Pool(1) as pool:
+      peak_memory = pool.apply(traced_peak_memory, (agent_file, code_length, num_colours, num_guesses, num_games,
+                                                    seed))
+
+   game = MastermindGame(code_length=code_length, num_colours=num_colours)
+   with contextlib.redirect_stdout(io.StringIO()):
+      average_score = game.run(agentFile=agent_file, num_guesses=num_guesses, num_games=num_games, seed=seed)
+
+   summary = game.metrics.summary()
+   return {'average_score': average_score,
+           'move_p50': summary['all_moves'].get('p50'),
+           'move_p95': summary['all_moves'].get('p95'),
+           'move_p95_per_guess': {guess: stats['p95'] for guess, stats in summary['moves'].items()},
+           'init_time': summary['init'].get('mean'),
+           'peak_memory': peak_memory}
+
+def find_regressions(results, baseline, threshold, score_threshold=0.0):
+   """Returns a list of (config, measurement, baseline value, value) for the average scores more than
+   score_threshold higher and the other measurements more than the fraction threshold worse (higher) than in the
+   baseline"""
+
+   regressions = []
+   for key, result in results.items():
+      if key not in baseline:
+         continue
+      base = baseline[key].get('average_score')
+      value = result.get('average_score')
+      if base is not None and value is not None and value > base + score_threshold:
+         regressions.append((key, 'average_score', base, value))
+      for name, floor in COMPARED.items():
+         base = baseline[key].get(name)
+         value = result.get(name)
+         if base is None or value is None:
+            continue
+         if value > base * (1 + threshold) and value - base > floor:
+            regressions.append((key, name, base, value))
+   return regressions
+
+def run_benchmark(settings=benchmark_settings):
+   """Benchmarks every agent and board of the settings, returns a dictionary of results keyed by config_key"""
+
+   results = {}
+   for agent_file in settings['agentFiles']:
+      for code_length in settings['codeLengths']:
+         for num_colours in settings['numbersOfColours']:
+            key = config_key(agent_file, code_length, num_colours)
+            print("Benchmarking %s..." % key)
+            results[key] = benchmark_config(agent_file, code_length, num_colours, settings['maxNumberOfGuesses'],
+                                            settings['numberOfGames'], settings['seed'])
+   return results
+
+def print_results(results, baseline):
+   print("%-28s %8s %10s %10s %10s %10s" % ("", "score", "p50 (ms)", "p95 (ms)", "init (ms)", "peak (MB)"))
+   for key, result in results.items():
+      print("%-28s %8.3f %10.3f %10.3f %10.1f %10.2f" % (key, result['average_score'], result['move_p50']*1e3,
+                                                         result['move_p95']*1e3, result['init_time']*1e3,
+                                                         result['peak_memory']/2**20))
+      if key in baseline:
+         base = baseline[key]
+         print("%-28s %8.3f %10.3f %10.3f %10.1f %10.2f" % ("   baseline", base['average_score'],
+                                                            base['move_p50']*1e3, base['move_p95']*1e3,
+                                                            base['init_time']*1e3, base['peak_memory']/2**20))
+
+
+if __name__ == "__main__":
+
+   results = run_benchmark()
+
+   baseline = {}
+   if os.path.exists(benchmark_settings['baselineFile']):
+      with open(benchmark_settings['baselineFile']) as f:
+         baseline = json.load(f)
+
+   print_results(results, baseline)
+
+   with open(benchmark_settings['resultsFile'], 'a') as f:
+      f.write(json.dumps({'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'seed': benchmark_settings['seed'],
+                          'numberOfGames': benchmark_settings['numberOfGames'], 'results': results}) + "\n")
+
+   if '--save-baseline' in sys.argv[1:]:
+      with open(benchmark_settings['baselineFile'], 'w') as f:
+         json.dump(results, f, indent=1)
+      print("Baseline saved to %s." % benchmark_settings['baselineFile'])
+
+   regressions = find_regressions(results, baseline, benchmark_settings['regressionThreshold'],
+                                  benchmark_settings['scoreThreshold'])
+   for key, name, base, value in regressions:
+      print("REGRESSION %s: %s %.6g -> %.6g" % (key, name, base, value))
+   if regressions:
+      sys.exit(1)
+   if baseline:
+      print("No regressions against %s." % benchmark_settings['baselineFile'])
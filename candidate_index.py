@@ -0,0 +1,197 @@
+__author__ = "Guangjie Guo"
+__organization__ = "COSC343/AIML402, University of Otago"
+__email__ = "guo_guangjie@163.com"
+
+import threading
+from collections import OrderedDict
+import numpy as np
+from mastermind import evaluate_guesses, encode_feedback, num_feedbacks
+from feedback_table import load_feedback_table
+
+# A set of codes is held as a bitset over the corpus, numpy.packbits of a boolean array with a bit per corpus code
+# (bit 7 of byte 0 is code 0).  The postings of a guess are the bitsets of the codes giving each feedback to it, a
+# num_feedbacks x ceil(N / 8) uint8 array.
+
+# Number of bits set in each byte value, for numpy versions without bitwise_count
+POPCOUNT = np.array([bin(b).count('1') for b in range(256)], dtype='uint8')
+
+# Partition sizes from popcounts cost the same whatever the number of candidates, they are cheaper than computing
+# feedback once the candidates are about this fraction of the corpus
+POPCOUNT_MIN_FRACTION = 0.3
+
+
+def popcount(bitsets):
+   """Returns the number of bits set in each row of an array of bitsets"""
+
+   if hasattr(np, 'bitwise_count'):
+      return np.bitwise_count(bitsets).sum(axis=-1, dtype='int64')
+   return POPCOUNT[bitsets].sum(axis=-1, dtype='int64')
+
+def to_bitset(codes, num_codes):
+   """Returns the bitset of an array of corpus indices"""
+
+   members = np.zeros(num_codes, dtype='bool')
+   members[codes] = True
+   return np.packbits(members)
+
+def from_bitset(bitset, num_codes):
+   """Returns the corpus indices of the codes in a bitset, in increasing order"""
+
+   return np.flatnonzero(np.unpackbits(bitset, count=num_codes)).astype('int32')
+
+
+class CandidateIndex:
+   """
+             An inverted index of the corpus: for frequently played guesses, the bitset of the codes giving each
+             feedback to the guess (its postings)
+
+             Building the postings of a guess takes its feedback against the whole corpus, as much as filtering
+             the corpus by it, so a guess is indexed once filtering by it has scanned min_scans times as many codes
+             as the corpus has (the candidates of each lookup, the corpus for each guess of a replay).  The postings
+             of the least recently used guesses are dropped to keep the index under max_bytes, and the codes scanned
+             are tracked for the max_tracked guesses looked up most recently only.  Filtering
+             candidates by an indexed guess then looks bits up instead of computing feedback, and the codes
+             consistent with several indexed guesses are the AND of their postings.
+
+             ...
+
+             Attributes
+             ----------
+             max_bytes: int
+                 the most memory the postings may take
+             size: int
+                 the memory the postings take
+             hits, misses, builds, evictions: int
+                 the number of lookups that found postings, that did not, and the number of guesses indexed and
+                 dropped
+
+             Methods
+             -------
+             postings(guess, scanned)
+                 Returns the postings of a guess, None if it is not indexed (yet)
+             filter(guess, feedback, candidates)
+                 Returns the candidates giving feedback to guess, None if the guess is not indexed
+             consistent(history)
+                 Returns the codes consistent with a list of (guess, feedback) and the entries of it not indexed
+             indexed(guess)
+                 Returns the postings of a guess if it is indexed, None otherwise, without counting towards indexing
+             partition_sizes(guess, bitset)
+                 Returns the number of candidates giving each feedback to guess, None if it is not indexed
+             """
+
+   def __init__(self, corpus, num_colours, max_bytes, min_scans=2, max_tracked=10000):
+      self.corpus = corpus
+      self.num_colours = num_colours
+      self.num_codes = len(corpus)
+      self.num_feedbacks = num_feedbacks(corpus.shape[1])
+      self.max_bytes = max_bytes
+      self.min_scans = min_scans
+      self.max_tracked = max_tracked
+      self.entries = OrderedDict()
+      self.scanned = OrderedDict()
+      self.size = 0
+      self.hits = 0
+      self.misses = 0
+      self.builds = 0
+      self.evictions = 0
+      self.lock = threading.Lock()
+
+   def posting_bytes(self):
+      return self.num_feedbacks * ((self.num_codes + 7) // 8)
+
+   def build_postings(self, guess):
+      table = load_feedback_table(self.corpus.shape[1], self.num_colours)
+      if table is not None:
+         feedback = np.asarray(table[guess])
+      else:
+         in_place, in_colour = evaluate_guesses(self.corpus[[guess]], self.corpus, self.num_colours)
+         feedback = encode_feedback(in_place, in_colour, self.corpus.shape[1])[0]
+      return np.packbits(feedback[None, :] == np.arange(self.num_feedbacks, dtype=feedback.dtype)[:, None],
+                         axis=1)
+
+   def postings(self, guess, scanned):
+      """Returns the postings of a guess, None if it is not indexed; scanned is the number of codes the lookup
+      would have filtered without the index, counted towards indexing the guess"""
+
+      guess = int(guess)
+      with self.lock:
+         entry = self.entries.get(guess)
+         if entry is not None:
+            self.entries.move_to_end(guess)
+            self.hits += 1
+            return entry
+         self.misses += 1
+         self.scanned[guess] = self.scanned.get(guess, 0) + scanned
+         self.scanned.move_to_end(guess)
+         if len(self.scanned) > self.max_tracked:
+            self.scanned.popitem(last=False)
+         if self.scanned[guess] < self.min_scans * self.num_codes or self.posting_bytes() > self.max_bytes:
+            return None
+
+      entry = self.build_postings(guess)
+      with self.lock:
+         if guess not in self.entries:
+            self.entries[guess] = entry
+            self.size += entry.nbytes
+            self.builds += 1
+            self.scanned.pop(guess, None)
+         while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= evicted.nbytes
+            self.evictions += 1
+      return entry
+
+   def indexed(self, guess):
+      with self.lock:
+         entry = self.entries.get(int(guess))
+         if entry is not None:
+            self.entries.move_to_end(int(guess))
+            self.hits += 1
+         return entry
+
+   def filter(self, guess, feedback, candidates):
+      postings = self.postings(guess, len(candidates))
+      if postings is None:
+         return None
+      bits = postings[feedback]
+      return candidates[(bits[candidates >> 3] >> (7 - (candidates & 7))) & 1 == 1]
+
+   def consistent(self, history):
+      """ Returns the codes consistent with the indexed entries of a history, as an array of corpus indices, and
+      the entries not indexed, for the caller to filter by
+
+            :param history: list of (guess, feedback) with corpus indices and encoded feedback
+
+            :return: the codes (all of them if no entry is indexed) and a list of the entries not indexed
+      """
+
+      bitset = None
+      rest = []
+      for guess, feedback in history:
+         postings = self.postings(guess, self.num_codes)
+         if postings is None:
+            rest.append((guess, feedback))
+         elif bitset is None:
+            bitset = postings[feedback].copy()
+         else:
+            bitset &= postings[feedback]
+
+      if bitset is None:
+         return np.arange(self.num_codes, dtype='int32'), rest
+      return from_bitset(bitset, self.num_codes), rest
+
+   def partition_sizes(self, guess, bitset):
+      """Returns the num_feedbacks sizes of the partition of the candidates in a bitset (see to_bitset) by their
+      feedback to guess, from popcounts of the postings, or None if the guess is not indexed (scoring guesses
+      doesn't count towards indexing them)"""
+
+      postings = self.indexed(guess)
+      if postings is None:
+         return None
+      return popcount(postings & bitset)
+
+   def stats(self):
+      """Returns a dictionary of the counters, the number of guesses indexed and the size of their postings"""
+
+      return {'hits': self.hits, 'misses': self.misses, 'builds': self.builds, 'evictions': self.evictions,
+              'guesses': len(self.entries), 'bytes': self.size}
@@ -0,0 +1,93 @@
+__author__ = "Guangjie Guo"
+__organization__ = "COSC343/AIML402, University of Otago"
+__email__ = "guo_guangjie@163.com"
+
+import os
+import threading
+import numpy as np
+from mastermind import gen_codes, evaluate_guesses, encode_feedback
+from settings import game_settings
+
+# Tables already opened by this process, keyed by (code_length, num_colours)
+_open_tables = {}
+
+
+def cache_dir():
+   """Returns the directory holding precomputed files, relative paths in settings are taken from this file's
+   directory"""
+
+   path = game_settings.get('cacheDir', 'cache')
+   if not os.path.isabs(path):
+      path = os.path.join(os.path.dirname(os.path.abspath(__file__)), path)
+   return path
+
+def table_path(code_length, num_colours):
+   return os.path.join(cache_dir(), "feedback_L%d_C%d.npy" % (code_length, num_colours))
+
+def build_feedback_table(code_length, num_colours, path, chunk_rows=256):
+   """ Computes the feedback of every code against every other code and saves it as a .npy file
+
+         :param code_length: the length of the code
+
+                num_colours: the number of colours
+
+                path: the file to write, it is replaced atomically so concurrent readers never see a partial table
+
+                chunk_rows: number of guess rows evaluated at once
+   """
+
+   codes = gen_codes(num_colours, code_length)
+   n = len(codes)
+
+   os.makedirs(os.path.dirname(path), exist_ok=True)
+   tmp_path = "%s.%d.%d.tmp" % (path, os.getpid(), threading.get_ident())
+   table = np.lib.format.open_memmap(tmp_path, mode='w+', dtype='uint8', shape=(n, n))
+   for start in range(0, n, chunk_rows):
+      in_place, in_colour = evaluate_guesses(codes[start:start + chunk_rows], codes, num_colours)
+      table[start:start + chunk_rows] = encode_feedback(in_place, in_colour, code_length)
+   table.flush()
+   del table
+   os.replace(tmp_path, path)
+
+def load_feedback_table(code_length, num_colours, build=True):
+   """ Returns the memory-mapped feedback table for a board configuration
+
+         The table is an N x N uint8 array, N = num_colours**code_length, where entry [i, j] is the feedback of
+         code i (as a guess) against code j (as the target) packed by encode_feedback, codes being indexed as
+         in gen_codes.  The file is opened read-only, so every process on the machine shares the same pages.
+
+         :param code_length: the length of the code
+
+                num_colours: the number of colours
+
+                build: whether to build the table if it is not on disk yet
+
+         :return: the table, or None if it is disabled, too big (see 'feedbackTableMaxBytes' in settings) or
+                  not built
+   """
+
+   key = (code_length, num_colours)
+   if key in _open_tables:
+      return _open_tables[key]
+
+   n = num_colours ** code_length
+   if not game_settings.get('useFeedbackTable', True) or n * n > game_settings.get('feedbackTableMaxBytes', 0):
+      return None
+
+   path = table_path(code_length, num_colours)
+   if not os.path.exists(path):
+      if not build:
+         return None
+      build_feedback_table(code_length, num_colours, path)
+
+   table = np.load(path, mmap_mode='r')
+   _open_tables[key] = table
+   return table
+
+
+if __name__ == "__main__":
+
+   load_feedback_table(game_settings['codeLength'], game_settings['numberOfColours'])
+   print("Feedback table for code length %d and %d colours is in %s" %
+         (game_settings['codeLength'], game_settings['numberOfColours'],
+          table_path(game_settings['codeLength'], game_settings['numberOfColours'])))
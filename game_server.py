@@ -0,0 +1,333 @@
+__author__ = "Guangjie Guo"
+__organization__ = "COSC343/AIML402, University of Otago"
+__email__ = "guo_guangjie@163.com"
+
+import os
+import json
+import time
+import random
+import asyncio
+import itertools
+import concurrent.futures
+import numpy as np
+from mastermind import COLOURS, Player, evaluate_guess
+from agent_worker import to_json
+from settings import server_settings
+
+# Protocol of the game server: JSON lines as in agent_worker.py, a request {"id": <int>, "method": <name>,
+# "params": {...}} is answered with {"id": <int>, "result": ...} or {"id": <int>, "error": <message>}, the
+# requests of a connection one at a time in the order they were sent.  A connection may drive any number of
+# sessions, and a session may be driven from any connection.  Methods:
+#
+#    start - params code_length, num_colours, num_guesses and optionally agent (an agent file hosted by the server
+#            to play the session's moves) and target (a list of colours, random if not given): starts a session,
+#            the result is {"session": <id>, "colours": [...]}
+#    guess - params session and guess (a list of colours): plays a guess of the client
+#    move  - params session: plays the next guess of the session's agent
+#    end   - params session: ends a session, the result is {"score": <int or null>, "target": [...]}
+#    stats - no params: the result is {"sessions": <open sessions>, "started": <int>, "finished": <int>}
+#
+# guess and move answer {"guess": [...], "in_place": <int>, "in_colour": <int>, "guesses": <guesses so far>,
+# "over": <bool>, "score": <int, null until the game is over>}, scored as MastermindGame.play scores games.
+
+
+def create_player(agent_file, code_length, colours, num_guesses):
+   """Creates and warms up (see Player.warm_up) a session's agent, so that its setup isn't part of its first move"""
+
+   player = Player(agent_file, code_length, colours, num_guesses)
+   player.warm_up()
+   return player
+
+
+class Session:
+   """
+             The state of one game hosted by the server
+
+             ...
+
+             Attributes
+             ----------
+             target : list of str
+                 the code to guess
+             guesses : int
+                 the number of guesses played so far
+             score : int
+                 the score of the game once it is over, None until then
+             player : Player
+                 the agent playing the session's moves, None if the client plays them (with guess)
+             lock : asyncio.Lock
+                 held while a move of the session is played, so that its moves are played one at a time
+             last_active : float
+                 the time of the last request about the session
+             """
+
+   def __init__(self, session_id, code_length, colours, num_guesses, target, player=None):
+      self.session_id = session_id
+      self.code_length = code_length
+      self.colours = colours
+      self.num_guesses = num_guesses
+      self.target = target
+      self.player = player
+      self.guesses = 0
+      self.score = None
+      self.last_guess = np.zeros(shape=(code_length)).astype('uint8')
+      self.in_place = 0
+      self.in_colour = 0
+      self.lock = asyncio.Lock()
+      self.last_active = time.monotonic()
+
+   def play_guess(self, guess):
+      """Evaluates a guess against the target and returns its result (see the protocol), None gives the game up"""
+
+      if self.score is not None:
+         raise RuntimeError("Error! Session %d is over" % self.session_id)
+
+      if guess is None:
+         self.score = self.num_guesses * 2
+         return {'guess': None, 'in_place': 0, 'in_colour': 0, 'guesses': self.guesses, 'over': True,
+                 'score': self.score}
+
+      if not isinstance(guess, (list, np.ndarray)) or len(guess) != self.code_length:
+         raise RuntimeError("Error! A guess must be a list of %d colours" % self.code_length)
+      guess = [str(c) for c in guess]
+      for c in guess:
+         if c not in self.colours:
+            raise RuntimeError("Error! The guess %s contains illegal character '%s' (legal characters are %s)"
+                               % (guess, c, self.colours))
+
+      in_place, in_colour = evaluate_guess(np.array(guess), np.array(self.target))
+      self.guesses += 1
+      self.last_guess, self.in_place, self.in_colour = guess, in_place, in_colour
+      if in_place == self.code_length:
+         self.score = self.guesses
+      elif self.guesses >= self.num_guesses:
+         self.score = self.guesses * 2
+      return {'guess': guess, 'in_place': int(in_place), 'in_colour': int(in_colour), 'guesses': self.guesses,
+              'over': self.score is not None, 'score': self.score}
+
+
+class GameServer:
+   """
+             An asyncio server hosting concurrent Mastermind sessions (see the protocol above)
+
+             Agents' constructors and moves run on a thread pool of agent_threads threads, so a slow agent holds
+             up its own session only.  The sessions of an agent file share its module (and, for my_agent.py, the
+             warm state of the board).  Targets drawn by the server are random and agents draw from the shared
+             random generators, so sessions are not reproducible.
+
+             ...
+
+             Attributes
+             ----------
+             sessions : dict
+                 the open sessions by id
+             max_sessions : int
+                 the most sessions open at a time, starting more fails
+             move_timeout : float
+                 the most seconds an agent may take for a move, the session's game is given up if it takes longer
+                 (the move still runs to its end on its thread), None for no limit
+             idle_timeout : float
+                 sessions without requests for this many seconds are ended, None to keep them until they end
+
+             Methods
+             -------
+             serve(socket_path=None, host='127.0.0.1', port=0)
+                 Serves on a Unix socket, or on localhost TCP if socket_path is None, until cancelled
+             """
+
+   def __init__(self, agent_threads=4, max_sessions=1000, move_timeout=None, idle_timeout=None):
+      self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=agent_threads)
+      self.max_sessions = max_sessions
+      self.move_timeout = move_timeout
+      self.idle_timeout = idle_timeout
+      self.sessions = {}
+      self.session_ids = itertools.count(1)
+      self.started = 0
+      self.finished = 0
+      self.rng = random.Random()
+
+   def session(self, params):
+      session = self.sessions.get(params['session'])
+      if session is None:
+         raise RuntimeError("Error! No session %s" % params['session'])
+      session.last_active = time.monotonic()
+      return session
+
+   def close_session(self, session):
+      if self.sessions.pop(session.session_id, None) is not None:
+         self.finished += 1
+
+   async def start(self, params):
+      if len(self.sessions) >= self.max_sessions:
+         raise RuntimeError("Error! Too many sessions (at most %d)" % self.max_sessions)
+
+      code_length = int(params['code_length'])
+      num_colours = int(params['num_colours'])
+      if num_colours > len(COLOURS):
+         raise RuntimeError("Error! At most %d colours are supported" % len(COLOURS))
+      colours = list(COLOURS[:num_colours])
+      target = params.get('target')
+      if target is None:
+         target = [self.rng.choice(colours) for _ in range(code_length)]
+      elif len(target) != code_length or any(c not in colours for c in target):
+         raise RuntimeError("Error! The target must be a list of %d of the colours %s" % (code_length, colours))
+
+      player = None
+      if params.get('agent') is not None:
+         loop = asyncio.get_running_loop()
+         player = await loop.run_in_executor(self.executor, create_player, params['agent'], code_length, colours,
+                                             int(params['num_guesses']))
+
+      session = Session(next(self.session_ids), code_length, colours, int(params['num_guesses']), list(target),
+                        player)
+      self.sessions[session.session_id] = session
+      self.started += 1
+      return {'session': session.session_id, 'colours': colours}
+
+   async def guess(self, params):
+      session = self.session(params)
+      async with session.lock:
+         return session.play_guess(params['guess'])
+
+   async def move(self, params):
+      session = self.session(params)
+      if session.player is None:
+         raise RuntimeError("Error! Session %d has no agent" % session.session_id)
+
+      async with session.lock:
+         if session.score is not None:
+            raise RuntimeError("Error! Session %d is over" % session.session_id)
+         percepts = (session.guesses, session.last_guess, session.in_place, session.in_colour)
+         loop = asyncio.get_running_loop()
+         try:
+            guess = await asyncio.wait_for(loop.run_in_executor(self.executor, session.player.agent.AgentFunction,
+                                                                percepts), self.move_timeout)
+         except asyncio.TimeoutError:
+            session.play_guess(None)
+            raise RuntimeError("Error! The agent did not answer within %g s, the game is given up"
+                               % self.move_timeout)
+         except Exception:
+            session.play_guess(None)
+            raise
+         return session.play_guess(guess)
+
+   async def end(self, params):
+      session = self.session(params)
+      self.close_session(session)
+      return {'score': session.score, 'target': session.target}
+
+   async def stats(self, params):
+      return {'sessions': len(self.sessions), 'started': self.started, 'finished': self.finished}
+
+   async def handle_request(self, method, params):
+      if method not in ('start', 'guess', 'move', 'end', 'stats'):
+         raise RuntimeError("Error! Unknown method '%s'" % method)
+      return await getattr(self, method)(params)
+
+   async def handle_connection(self, reader, writer):
+      try:
+         while True:
+            line = await reader.readline()
+            if not line:
+               break
+            try:
+               request = json.loads(line)
+            except ValueError:
+               request = None
+            if not isinstance(request, dict) or not isinstance(request.get('params', {}), dict):
+               response = {'id': request.get('id') if isinstance(request, dict) else None,
+                           'error': "Error! Malformed request"}
+            else:
+               try:
+                  response = {'id': request.get('id'),
+                              'result': await self.handle_request(request.get('method'), request.get('params', {}))}
+               except Exception as e:
+                  response = {'id': request.get('id'), 'error': str(e)}
+            writer.write((json.dumps(response, default=to_json) + "\n").encode())
+            await writer.drain()
+      except ConnectionError:
+         pass
+      finally:
+         writer.close()
+
+   async def expire_sessions(self):
+      """Ends the sessions idle for longer than idle_timeout, every idle_timeout / 2 seconds"""
+
+      while True:
+         await asyncio.sleep(self.idle_timeout / 2)
+         now = time.monotonic()
+         for session in list(self.sessions.values()):
+            if now - session.last_active > self.idle_timeout and not session.lock.locked():
+               self.close_session(session)
+
+   async def listen(self, socket_path=None, host='127.0.0.1', port=0):
+      """Starts listening and returns the asyncio server, port 0 picks a free port"""
+
+      if socket_path is not None:
+         if os.path.exists(socket_path):
+            os.remove(socket_path)
+         return await asyncio.start_unix_server(self.handle_connection, path=socket_path)
+      return await asyncio.start_server(self.handle_connection, host=host, port=port)
+
+   async def serve(self, socket_path=None, host='127.0.0.1', port=0):
+      server = await self.listen(socket_path, host, port)
+      expiry = asyncio.ensure_future(self.expire_sessions()) if self.idle_timeout else None
+      try:
+         async with server:
+            await server.serve_forever()
+      finally:
+         if expiry is not None:
+            expiry.cancel()
+         self.executor.shutdown(wait=False)
+
+
+class GameClient:
+   """ A connection to a game server, request(method, **params) returns the result of a request or raises its error
+
+         The requests of a client are sent one at a time, use a client per concurrent task.
+   """
+
+   def __init__(self, reader, writer):
+      self.reader = reader
+      self.writer = writer
+      self.next_id = 0
+
+   @classmethod
+   async def connect(cls, socket_path=None, host='127.0.0.1', port=None):
+      if socket_path is not None:
+         reader, writer = await asyncio.open_unix_connection(socket_path)
+      else:
+         reader, writer = await asyncio.open_connection(host, port)
+      return cls(reader, writer)
+
+   async def request(self, method, **params):
+      request_id = self.next_id
+      self.next_id += 1
+      self.writer.write((json.dumps({'id': request_id, 'method': method, 'params': params}, default=to_json)
+                         + "\n").encode())
+      await self.writer.drain()
+      line = await self.reader.readline()
+      if not line:
+         raise ConnectionError("Error! The game server closed the connection")
+      response = json.loads(line)
+      if 'error' in response:
+         raise RuntimeError(response['error'])
+      return response['result']
+
+   async def close(self):
+      self.writer.close()
+      await self.writer.wait_closed()
+
+
+if __name__ == "__main__":
+
+   server = GameServer(agent_threads=server_settings['agentThreads'], max_sessions=server_settings['maxSessions'],
+                       move_timeout=server_settings['moveTimeout'], idle_timeout=server_settings['idleTimeout'])
+   if server_settings['socketPath'] is not None:
+      print("Serving Mastermind sessions on %s" % server_settings['socketPath'])
+   else:
+      print("Serving Mastermind sessions on %s:%d" % (server_settings['host'], server_settings['port']))
+   try:
+      asyncio.run(server.serve(server_settings['socketPath'], server_settings['host'], server_settings['port']))
+   except KeyboardInterrupt:
+      pass
@@ -0,0 +1,90 @@
+__author__ = "Guangjie Guo"
+__organization__ = "COSC343/AIML402, University of Otago"
+__email__ = "guo_guangjie@163.com"
+
+import threading
+from collections import OrderedDict
+
+# Rough size in bytes of an entry apart from its candidate array (key tuples, the entry tuple, dictionary slot)
+ENTRY_OVERHEAD = 512
+
+
+def history_key(history):
+   """Returns a hashable key of a list of (guess, in_place, in_colour), guesses being sequences of colours"""
+
+   return tuple((tuple(guess), int(in_place), int(in_colour)) for guess, in_place, in_colour in history)
+
+
+class HistoryCache:
+   """
+             A least-recently-used cache of the agent's decisions, keyed by the history of the game
+
+             ...
+
+             Attributes
+             ----------
+             max_bytes: int
+                 the most memory the cached entries may take, older entries are evicted to stay under it
+             size: int
+                 the memory the cached entries take, estimated from the size of their candidate arrays (copies of
+                 the arrays given, if they are views)
+             lock : threading.Lock
+                 held while the cache is used, agents sharing it may run in threads (as in game_server.py)
+             hits, misses, evictions: int
+                 the number of lookups that found an entry, that did not, and the number of entries evicted
+
+             Methods
+             -------
+             get(key)
+                 Returns the (guess, candidates) cached for a history key, or None
+             put(key, guess, candidates)
+                 Caches the guess (None to cache the candidates only) and candidates of a history key
+             """
+
+   def __init__(self, max_bytes):
+      self.max_bytes = max_bytes
+      self.entries = OrderedDict()
+      self.size = 0
+      self.hits = 0
+      self.misses = 0
+      self.evictions = 0
+      self.lock = threading.Lock()
+
+   def __len__(self):
+      return len(self.entries)
+
+   def get(self, key):
+      with self.lock:
+         entry = self.entries.get(key)
+         if entry is None:
+            self.misses += 1
+            return None
+         self.entries.move_to_end(key)
+         self.hits += 1
+         return entry[:2]
+
+   def put(self, key, guess, candidates):
+      """Caches an entry unless it alone is larger than max_bytes; candidates must not be modified afterwards, a
+      view (e.g. into a partition, see my_agent.partition_lookup) is copied so that the entry doesn't keep the
+      array it views alive beyond its own size"""
+
+      if candidates.base is not None:
+         candidates = candidates.copy()
+      entry_size = candidates.nbytes + ENTRY_OVERHEAD
+      if entry_size > self.max_bytes:
+         return
+      with self.lock:
+         if key in self.entries:
+            self.size -= self.entries.pop(key)[2]
+         self.entries[key] = (guess, candidates, entry_size)
+         self.size += entry_size
+         while self.size > self.max_bytes:
+            _, (_, _, evicted_size) = self.entries.popitem(last=False)
+            self.size -= evicted_size
+            self.evictions += 1
+
+   def stats(self):
+      """Returns a dictionary of the counters, the number of entries and their size in bytes"""
+
+      return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'entries': len(self.entries),
+              'bytes': self.size}
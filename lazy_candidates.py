@@ -0,0 +1,132 @@
+__author__ = "Guangjie Guo"
+__organization__ = "COSC343/AIML402, University of Otago"
+__email__ = "guo_guangjie@163.com"
+
+import random
+import numpy as np
+
+
+class SearchBudgetExceeded(Exception):
+   """Raised by consistent_codes when the search visits more partial codes than its budget"""
+
+
+def consistent_codes(history, code_length, num_colours, rng=None, max_nodes=None):
+   """ Generates the codes consistent with the guesses and feedback so far, without building the corpus
+
+         Codes are built position by position with backtracking.  A partial code is abandoned as soon as one of
+         the (guess, feedback) constraints can no longer be met: for each guess the number of colours in place
+         and the number of colour matches regardless of position (in_place + in_colour) can only grow by at most
+         one per position still to fill, and can never shrink.
+
+         :param history: list of (guess, in_place, in_colour) with integer-encoded guesses
+
+                code_length: the length of the code
+
+                num_colours: the number of colours
+
+                rng: a numpy RandomState (or numpy.random) seeding the random order colours are tried in at each
+                     position (for sampling), None to generate the codes in increasing order
+
+                max_nodes: the most partial codes the search may visit before raising SearchBudgetExceeded, None
+                           for no limit
+
+         :return: a generator of consistent codes as tuples of colour indices
+   """
+
+   guesses = [list(np.asarray(guess).tolist()) for guess, _, _ in history]
+   in_place = [int(p) for _, p, _ in history]
+   matches = [int(p) + int(c) for _, p, c in history]
+   guess_counts = [np.bincount(guess, minlength=num_colours).tolist() for guess in guesses]
+   constraints = range(len(history))
+   shuffle = random.Random(rng.randint(2**31)).shuffle if rng is not None else None
+
+   code = [0] * code_length
+   code_counts = [0] * num_colours
+   exact = [0] * len(history)
+   common = [0] * len(history)
+   nodes = [0]
+
+   def extend(p):
+      nodes[0] += 1
+      if max_nodes is not None and nodes[0] > max_nodes:
+         raise SearchBudgetExceeded()
+      if p == code_length:
+         yield tuple(code)
+         return
+
+      remaining = code_length - p - 1
+      colours = list(range(num_colours))
+      if shuffle is not None:
+         shuffle(colours)
+      for c in colours:
+         feasible = True
+         for j in constraints:
+            e = exact[j] + (guesses[j][p] == c)
+            m = common[j] + (code_counts[c] < guess_counts[j][c])
+            if e > in_place[j] or e + remaining < in_place[j] or m > matches[j] or m + remaining < matches[j]:
+               feasible = False
+               break
+         if not feasible:
+            continue
+
+         for j in constraints:
+            exact[j] += guesses[j][p] == c
+            common[j] += code_counts[c] < guess_counts[j][c]
+         code_counts[c] += 1
+         code[p] = c
+
+         yield from extend(p + 1)
+
+         code_counts[c] -= 1
+         for j in constraints:
+            exact[j] -= guesses[j][p] == c
+            common[j] -= code_counts[c] < guess_counts[j][c]
+
+   return extend(0)
+
+def sample_consistent_codes(history, code_length, num_colours, n, rng, max_nodes=20000, max_repeats=20,
+                            max_total_nodes=200000):
+   """ Returns up to n codes consistent with the history as an array of integer-encoded codes
+
+         If the search finds at most n consistent codes within max_nodes, all of them are returned.  Otherwise
+         each code of the sample comes from a new randomised backtracking search, so that the sample is spread
+         over the consistent set rather than drawn from a single branch of the search.  Randomised backtracking
+         has a heavy tail (an unlucky early choice can leave a huge subtree without solutions), so each search
+         gets a node budget and is restarted when it runs out, with the budget doubled every time.  Sampling
+         stops early after max_repeats searches in a row find codes already in the sample, as the consistent set
+         is then not much bigger than the sample, or once the searches have visited max_total_nodes partial
+         codes in all, to bound the time of a move; a sample cut short this way keeps the codes found so far
+         (at least one, found by an unbounded search if need be).
+   """
+
+   codes = []
+   try:
+      for code in consistent_codes(history, code_length, num_colours, max_nodes=max_nodes):
+         codes.append(code)
+         if len(codes) > n:
+            break
+      complete = len(codes) <= n
+   except SearchBudgetExceeded:
+      complete = False
+
+   if not complete:
+      sample = set()
+      budget = max(100, max_nodes // n)
+      repeats = 0
+      total_nodes = max_nodes
+      while len(sample) < n and repeats < max_repeats and total_nodes < max_total_nodes:
+         total_nodes += budget
+         try:
+            code = next(consistent_codes(history, code_length, num_colours, rng, max_nodes=budget))
+         except SearchBudgetExceeded:
+            budget *= 2
+            continue
+         except StopIteration:
+            break
+         repeats = repeats + 1 if code in sample else 0
+         sample.add(code)
+      if not sample:
+         sample.update(codes[:1] or [next(consistent_codes(history, code_length, num_colours, rng))])
+      codes = sorted(sample)
+
+   return np.array(codes, dtype='uint8').reshape(-1, code_length)
@@ -0,0 +1,108 @@
+__author__ = "Guangjie Guo"
+__organization__ = "COSC343/AIML402, University of Otago"
+__email__ = "guo_guangjie@163.com"
+
+import time
+import asyncio
+import numpy as np
+from metrics import latency_summary
+from game_server import GameServer, GameClient
+from settings import load_settings, server_settings
+
+
+async def play_sessions(client, num_sessions, code_length, num_colours, num_guesses, agent_file, latencies, results):
+   """Plays num_sessions sessions one after another over client, its agent playing the moves, recording the latency
+   of each request by method and the (score, seconds, failed) of each session"""
+
+   async def timed(method, **params):
+      start = time.perf_counter()
+      try:
+         return await client.request(method, **params)
+      finally:
+         latencies[method].append(time.perf_counter() - start)
+
+   for _ in range(num_sessions):
+      start = time.perf_counter()
+      session = (await timed('start', code_length=code_length, num_colours=num_colours, num_guesses=num_guesses,
+                             agent=agent_file))['session']
+      failed = False
+      try:
+         result = {'over': False}
+         while not result['over']:
+            result = await timed('move', session=session)
+      except RuntimeError:
+         # The move failed and the server gave the game up, the session counts as failed
+         failed = True
+      score = (await timed('end', session=session))['score']
+      results.append((score, time.perf_counter() - start, failed))
+
+async def run_load(num_sessions, concurrency, code_length, num_colours, num_guesses, agent_file, socket_path=None,
+                   host='127.0.0.1', port=None):
+   """ Plays num_sessions sessions of an agent hosted by a game server, concurrency of them at a time, each
+   concurrent stream of sessions over a connection of its own
+
+         :return: a dictionary with the sessions per second, the average score of the sessions that didn't fail,
+                  the number of failed sessions (a move failed and the game was given up) and latency summaries (see metrics.latency_summary) of the sessions and of each request method
+   """
+
+   latencies = {'start': [], 'move': [], 'end': []}
+   results = []
+   clients = [await GameClient.connect(socket_path, host, port) for _ in range(concurrency)]
+   shares = [num_sessions // concurrency + (k < num_sessions % concurrency) for k in range(concurrency)]
+
+   start = time.perf_counter()
+   try:
+      await asyncio.gather(*[play_sessions(client, share, code_length, num_colours, num_guesses, agent_file,
+                                           latencies, results) for client, share in zip(clients, shares)])
+   finally:
+      for client in clients:
+         await client.close()
+   elapsed = time.perf_counter() - start
+
+   scores = [score for score, _, failed in results if not failed]
+   return {'sessions': len(results), 'seconds': elapsed, 'sessions_per_second': len(results) / elapsed,
+           'average_score': float(np.mean(scores)) if scores else None,
+           'failed': len(results) - len(scores),
+           'session': latency_summary([seconds for _, seconds, _ in results]),
+           'requests': {method: latency_summary(times) for method, times in latencies.items()}}
+
+def print_report(report):
+   print("%d sessions in %.2f s, %.1f sessions/s, average score %s, %d failed" % (
+      report['sessions'], report['seconds'], report['sessions_per_second'],
+      "-" if report['average_score'] is None else "%.3f" % report['average_score'], report['failed']))
+   print("Latency (ms):")
+   print("  %-8s %7s %9s %9s %9s %9s" % ("", "count", "p50", "p95", "p99", "max"))
+   for name, stats in [('session', report['session'])] + list(report['requests'].items()):
+      if stats['count'] > 0:
+         print("  %-8s %7d %9.2f %9.2f %9.2f %9.2f" % (name, stats['count'], stats['p50']*1e3, stats['p95']*1e3,
+                                                      stats['p99']*1e3, stats['max']*1e3))
+
+async def main():
+   # Unless useRunningServer is set, the load runs against a server started in this process
+   server = None
+   socket_path = server_settings['socketPath']
+   port = server_settings['port']
+   if not load_settings['useRunningServer']:
+      game_server = GameServer(agent_threads=server_settings['agentThreads'],
+                               max_sessions=server_settings['maxSessions'],
+                               move_timeout=server_settings['moveTimeout'])
+      server = await game_server.listen(socket_path, server_settings['host'], 0)
+      if socket_path is None:
+         port = server.sockets[0].getsockname()[1]
+
+   try:
+      report = await run_load(load_settings['numberOfSessions'], load_settings['concurrency'],
+                              load_settings['codeLength'], load_settings['numberOfColours'],
+                              load_settings['maxNumberOfGuesses'], load_settings['agentFile'], socket_path,
+                              server_settings['host'], port)
+   finally:
+      if server is not None:
+         server.close()
+         await server.wait_closed()
+         game_server.executor.shutdown()
+   print_report(report)
+
+
+if __name__ == "__main__":
+
+   asyncio.run(main())
@@ -3,10 +3,21 @@ __organization__ = "COSC343/AIML402, University of Otago"
 __email__ = "lech.szymanski@otago.ac.nz"
 
 import os,sys
+import copy
+import string
 import numpy as np
 import importlib
+import multiprocessing
+import concurrent.futures
+import queue
+import random
 import time
 from settings import game_settings
+from metrics import RunMetrics
+import profiler
+
+# The six colours of the original game come first, boards with more colours use the other capital letters
+COLOURS = ['B','R','G','Y','P','C'] + [c for c in string.ascii_uppercase if c not in 'BRGYPC']
 
 class bcolors:
    RED = '\033[1;30;41m'
@@ -102,6 +113,177 @@ def evaluate_guess(guess,target):
 
    return in_place, in_colour
 
+def encode_codes(codes, colours):
+   """ Converts codes of colour characters to integer-encoded codes
+
+         :param codes: an N x L structure of valid colour characters (or a single code of L characters)
+
+                colours: the list of colour characters, the index of a colour in the list is its integer code
+
+         :return: an N x L uint8 numpy array of colour indices
+   """
+
+   codes = np.array(codes, dtype=str)
+   if codes.ndim == 1:
+      codes = codes[np.newaxis, :]
+   encoded = np.full(codes.shape, 255, dtype='uint8')
+   for i, c in enumerate(colours):
+      encoded[codes == c] = i
+   if np.any(encoded == 255):
+      raise ValueError("Error! Code contains a character that is not one of the colours %s" % list(colours))
+   return encoded
+
+def decode_codes(codes, colours):
+   """ Converts integer-encoded codes back to codes of colour characters
+
+         :param codes: an N x L numpy array of colour indices (or a single code of L indices)
+
+                colours: the list of colour characters
+
+         :return: an N x L numpy array of colour characters
+   """
+
+   return np.array(colours)[np.asarray(codes)]
+
+def gen_codes(num_colours, code_length):
+   """ Generates all num_colours**code_length integer-encoded codes
+
+         :return: an N x code_length uint8 numpy array, the code in row i is i written in base num_colours
+   """
+
+   digits = np.arange(num_colours ** code_length)
+   codes = np.empty((len(digits), code_length), dtype='uint8')
+   for p in range(code_length - 1, -1, -1):
+      codes[:, p] = digits % num_colours
+      digits = digits // num_colours
+   return codes
+
+def code_indices(codes, num_colours):
+   """ Converts integer-encoded codes to their row index in gen_codes
+
+         :param codes: an N x L numpy array of integer-encoded codes
+
+                num_colours: the number of colours in the alphabet
+
+         :return: an N-dimensional int64 numpy array of code indices
+   """
+
+   codes = np.atleast_2d(codes)
+   indices = np.zeros(len(codes), dtype='int64')
+   for p in range(codes.shape[1]):
+      indices = indices * num_colours + codes[:, p]
+   return indices
+
+def colour_histograms(codes, num_colours):
+   """ Counts the occurrences of each colour in each code
+
+         :param codes: an N x L numpy array of integer-encoded codes
+
+                num_colours: the number of colours in the alphabet
+
+         :return: an N x num_colours uint8 numpy array of colour counts
+   """
+
+   codes = np.atleast_2d(codes)
+   hist = np.zeros((len(codes), num_colours), dtype='uint8')
+   rows = np.arange(len(codes))
+   for p in range(codes.shape[1]):
+      np.add.at(hist, (rows, codes[:, p]), 1)
+   return hist
+
+def encode_feedback(in_place, in_colour, code_length):
+   """ Packs (in_place, in_colour) feedback into a single small integer in_place*(code_length+1)+in_colour
+
+         :param in_place: number (or array of numbers) of correct colours in place
+
+                in_colour: number (or array of numbers) of correct colours out of place
+
+                code_length: the length of the code
+
+         :return: the encoded feedback, as uint8 when given arrays
+   """
+
+   if isinstance(in_place, np.ndarray):
+      return (in_place.astype('uint8') * (code_length + 1) + in_colour).astype('uint8')
+   return int(in_place) * (code_length + 1) + int(in_colour)
+
+def num_feedbacks(code_length):
+   """Returns the number of distinct values encode_feedback can give for a code length"""
+
+   return (code_length + 1) ** 2
+
+def decode_feedback(feedback, code_length):
+   """ Unpacks feedback encoded by encode_feedback
+
+         :return: a tuple in_place, in_colour
+   """
+
+   return divmod(feedback, code_length + 1)
+
+def evaluate_guesses(guesses, targets, num_colours=None):
+   """ Evaluates every guess against every target in a single vectorised pass
+
+         :param guesses: a G x L numpy array of integer-encoded codes (see encode_codes)
+
+                targets: a T x L numpy array of integer-encoded codes
+
+                num_colours: the number of colours in the alphabet, inferred from the codes when None
+
+
+         :return: a tuple of 2 matrices:
+
+                  G x T uint8 matrix that gives the number of correct colours in place of each guess against
+                                each target
+
+                  G x T uint8 matrix that gives the number of correct colours out of place of each guess against
+                                each target
+
+         The result for each pair matches evaluate_guess.  The number of colour matches regardless of position
+         is the sum over colours of the smaller of the two colour counts, so no pairwise matching loop is needed.
+   """
+
+   guesses = np.atleast_2d(np.asarray(guesses))
+   targets = np.atleast_2d(np.asarray(targets))
+   if num_colours is None:
+      num_colours = int(max(guesses.max(), targets.max())) + 1
+
+   in_place = np.zeros((len(guesses), len(targets)), dtype='uint8')
+   for p in range(guesses.shape[1]):
+      in_place += guesses[:, p, np.newaxis] == targets[np.newaxis, :, p]
+
+   guess_hist = colour_histograms(guesses, num_colours)
+   target_hist = colour_histograms(targets, num_colours)
+   in_colour = np.zeros_like(in_place)
+   for c in range(num_colours):
+      in_colour += np.minimum(guess_hist[:, c, np.newaxis], target_hist[np.newaxis, :, c])
+   in_colour -= in_place
+
+   return in_place, in_colour
+
+def evaluate_pairs(guesses, targets, num_colours=None):
+   """ Evaluates each guess against the target in the same row
+
+         :param guesses: an N x L numpy array of integer-encoded codes
+
+                targets: an N x L numpy array of integer-encoded codes
+
+                num_colours: the number of colours in the alphabet, inferred from the codes when None
+
+         :return: a tuple of two N-dimensional uint8 vectors, the number of correct colours in place and out of
+                  place of each guess against its target
+   """
+
+   guesses = np.atleast_2d(np.asarray(guesses))
+   targets = np.atleast_2d(np.asarray(targets))
+   if num_colours is None:
+      num_colours = int(max(guesses.max(), targets.max())) + 1
+
+   in_place = np.sum(guesses == targets, axis=1).astype('uint8')
+   common = np.minimum(colour_histograms(guesses, num_colours), colour_histograms(targets, num_colours))
+   in_colour = (np.sum(common, axis=1) - in_place).astype('uint8')
+
+   return in_place, in_colour
+
 # Class player is a wrapper for a player agent
 class Player:
    def __init__(self, playerFile,code_length,colours,num_guesses):
@@ -121,19 +303,41 @@ class Player:
       except Exception as e:
          raise RuntimeError(str(e))
 
+      start = time.perf_counter()
       try:
          self.agent = self.exec.MastermindAgent(code_length=code_length, colours=colours,num_guesses=num_guesses)
       except Exception as e:
          raise RuntimeError(str(e))
+      self.init_time = time.perf_counter() - start
+
+   def warm_up(self):
+      """Runs the agent's optional warm_up method, which sets up what it would otherwise set up on its first move,
+      and adds its running time to init_time"""
+
+      warm_up = getattr(self.agent, 'warm_up', None)
+      if warm_up is None:
+         return
+
+      start = time.perf_counter()
+      try:
+         warm_up()
+      except Exception as e:
+         raise RuntimeError(str(e))
+      self.init_time += time.perf_counter() - start
 
 
 class MastermindGame:
 
    def __init__(self,code_length=5,num_colours=3,verbose=False,tournament=False):
 
-      self.colours = ['B','R','G','Y','P','C']
+      if num_colours > len(COLOURS):
+         raise RuntimeError("Error! At most %d colours are supported" % len(COLOURS))
+      self.colours = COLOURS[:num_colours]
       self.code_length = code_length
       self.verbose = verbose
+      self.feedback_table = None
+      self.metrics = None
+      self.errors = []
       if tournament:
          self.throwError = self.errorAndReturn
       else:
@@ -142,8 +346,6 @@ class MastermindGame:
       if self.verbose:
          print("Mastermind")
 
-         self.colours = self.colours[:num_colours]
-
          print("  Code length: %s" % self.code_length)
          print("      Colours: %s" % self.colours)
 
@@ -152,10 +354,36 @@ class MastermindGame:
 
    def errorAndReturn(self,errorStr):
       self.errorStr = errorStr
+      self.errors.append(errorStr)
       return None
 
 
 
+   def load_feedback_table(self):
+      """Memory-maps the precomputed feedback table for the current board, if enabled in settings"""
+
+      from feedback_table import load_feedback_table
+
+      self.feedback_table = load_feedback_table(self.code_length, len(self.colours))
+      self.colour_index = {str(c): i for i, c in enumerate(self.colours)}
+
+   def evaluate(self,actions,target):
+      """Returns the (in_place, in_colour) feedback of a guess, by table lookup when the table is loaded"""
+
+      if self.feedback_table is not None and len(actions) == self.code_length:
+         try:
+            guess_index = 0
+            target_index = 0
+            for a, t in zip(actions, target):
+               guess_index = guess_index * len(self.colour_index) + self.colour_index[a]
+               target_index = target_index * len(self.colour_index) + self.colour_index[t]
+         except KeyError:
+            # Illegal characters in the guess, the generic evaluation handles them
+            return evaluate_guess(actions,target)
+         return divmod(int(self.feedback_table[guess_index, target_index]), self.code_length + 1)
+
+      return evaluate_guess(actions,target)
+
    def play(self,player,target,num_guesses):
 
       score = 0
@@ -163,38 +391,45 @@ class MastermindGame:
       actions = np.zeros(shape=(self.code_length)).astype('uint8')
       in_place = 0
       in_colour = 0
+      profiler.start_game()
       while guess<num_guesses+1:
 
          percepts = (guess, actions, in_place, in_colour)
 
+         start = time.perf_counter()
          try:
-            actions = player.agent.AgentFunction(percepts)
+            with profiler.phase('move_%d' % (guess + 1)):
+               actions = player.agent.AgentFunction(percepts)
          except Exception as e:
-            self.throwError(str(e))
-
-         try:
-            if not isinstance(actions,list) and not isinstance(actions,np.ndarray):
-               if actions == None:
-                  score = num_guesses
+            # In a tournament a failing agent gives up the game
+            actions = self.throwError(str(e))
+         if self.metrics is not None:
+            self.metrics.record_move(guess + 1, time.perf_counter() - start,
+                                     getattr(player.agent, 'num_candidates', None))
+
+         if not isinstance(actions,list) and not isinstance(actions,np.ndarray):
+            if actions is None:
+               score = num_guesses
+               break
+            error = "Error! AgentFunction from '%s.py' returned a %s (expecting a list or a numpy array)" % (player.playerFile,type(actions))
+         elif len(actions) != self.code_length:
+            error = "Error! AgentFunction from '%s.py' did return a list with %d items (expecting %d items)." % (
+                     player.playerFile, len(actions), self.code_length)
+         else:
+            error = None
+            for a in actions:
+               if a not in self.colours:
+                  error = "Error! AgentFunction from '%s.py' returned a list \n%s\n, which contains illegal character '%s' (legal characters are %s)." % (
+                     player.playerFile, actions, a, self.colours)
                   break
-               else:
-                  self.throwError("Error! AgentFunction from '%s.py' returned a %s (expecting a list or a numpy array)" % (player.playerFile,type(actions)))
-
-         except Exception as e:
-            self.throwError(str(e))
-
-         if len(actions) != self.code_length:
-            self.throwError(
-                  "Error! AgentFunction from '%s.py' did return a list with %d items (expecting %d items)." % (
-                     player.playerFile, len(actions), self.code_length))
 
-            for j, a in enumerate(actions):
-               if a not in self.colours:
-                  self.throwError(
-                     "Error! AgentFunction from '%s.py' returned a list \n%s\n, which contains illegal character '%c' (legal characters are %s)."
-                     % (player.playerFile, actions, a, self.colours))
+         if error is not None:
+            # In a tournament an agent making an illegal guess gives up the game
+            self.throwError(error)
+            score = num_guesses
+            break
 
-         in_place, in_colour = evaluate_guess(actions,target)
+         in_place, in_colour = self.evaluate(actions,target)
 
 
          score += 1
@@ -238,42 +473,297 @@ class MastermindGame:
       return score*2
 
 
-   def run(self,agentFile='agent_human.py',num_guesses=6, num_games=1000,seed=None):
+   def evaluate_batch(self,actions,targets):
+      """Returns the (in_place, in_colour) feedback vectors of a batch of guesses against their targets"""
 
-      if self.verbose:
-         print("Game play:")
-         print("  Num guesses:      %d" % num_guesses)
-         print("  Num rounds:       %d" % num_games)
+      guesses = encode_codes(actions, self.colours)
+      targets = encode_codes(targets, self.colours)
+      if self.feedback_table is not None:
+         feedback = self.feedback_table[code_indices(guesses, len(self.colours)), code_indices(targets, len(self.colours))]
+         return decode_feedback(feedback.astype('int64'), self.code_length)
+      return evaluate_pairs(guesses, targets, len(self.colours))
 
-      if seed is None:
-         seed = int(time.time())
+   def play_batch(self,player,targets,num_guesses):
+      """ Plays the games of the given targets in lockstep, advancing all of them by one guess per round
 
-      rnd = np.random.RandomState(seed)
+            The agent gets a single AgentFunctionBatch(percepts_batch) call per round, where percepts_batch has
+            the percepts of every game of the batch, in the order of the targets, and None for the games already
+            over.  It returns a guess for each game (ignored for the games already over).  Feedback is computed
+            for all the games of the round at once.  Agents without AgentFunctionBatch play the games one after
+            another with play.  Scores are the same as those of play, but nothing is printed.
+
+            :return: a list of the scores of the games
+      """
+
+      if not hasattr(player.agent, 'AgentFunctionBatch'):
+         return [self.play(player,target=target,num_guesses=num_guesses) for target in targets]
+
+      num_games = len(targets)
+      scores = [0] * num_games
+      active = list(range(num_games))
+      percepts_batch = [(0, np.zeros(shape=(self.code_length)).astype('uint8'), 0, 0) for _ in range(num_games)]
+
+      # The profiler counts a batch as one game
+      profiler.start_game()
+      for guess in range(num_guesses):
+         start = time.perf_counter()
+         try:
+            with profiler.phase('move_%d' % (guess + 1)):
+               actions_batch = player.agent.AgentFunctionBatch(percepts_batch)
+         except Exception as e:
+            # In a tournament a failing agent gives up all the games of the batch
+            actions_batch = self.throwError(str(e))
+         if self.metrics is not None:
+            # The time of the call is shared evenly by the games of the round
+            move_time = (time.perf_counter() - start) / len(active)
+            for _ in active:
+               self.metrics.record_move(guess + 1, move_time)
+
+         if not isinstance(actions_batch,list) or len(actions_batch) != num_games:
+            if actions_batch is not None:
+               self.throwError("Error! AgentFunctionBatch from '%s.py' did not return a list of %d guesses." % (
+                  player.playerFile, num_games))
+            # The active games are given up below
+            break
+
+         playing = []
+         for g in active:
+            actions = actions_batch[g]
+            if actions is None:
+               # The agent gave the game up
+               scores[g] = num_guesses * 2
+               percepts_batch[g] = None
+               continue
+            if not isinstance(actions,list) and not isinstance(actions,np.ndarray):
+               error = "Error! AgentFunctionBatch from '%s.py' returned a %s (expecting a list or a numpy array)" % (player.playerFile,type(actions))
+            elif len(actions) != self.code_length:
+               error = "Error! AgentFunctionBatch from '%s.py' did return a list with %d items (expecting %d items)." % (
+                  player.playerFile, len(actions), self.code_length)
+            else:
+               error = None
+               for a in actions:
+                  if a not in self.colours:
+                     error = "Error! AgentFunctionBatch from '%s.py' returned a list \n%s\n, which contains illegal character '%s' (legal characters are %s)." % (
+                        player.playerFile, actions, a, self.colours)
+                     break
+
+            if error is None:
+               playing.append(g)
+            else:
+               # In a tournament an agent making an illegal guess gives up the game
+               self.throwError(error)
+               scores[g] = num_guesses * 2
+               percepts_batch[g] = None
+
+         if len(playing) == 0:
+            break
+
+         in_place, in_colour = self.evaluate_batch([actions_batch[g] for g in playing], [targets[g] for g in playing])
+
+         active = []
+         for g, p, c in zip(playing, in_place, in_colour):
+            if p == self.code_length:
+               scores[g] = guess + 1
+               percepts_batch[g] = None
+            else:
+               percepts_batch[g] = (guess + 1, actions_batch[g], int(p), int(c))
+               active.append(g)
+
+         if len(active) == 0:
+            break
+
+      for g in active:
+         scores[g] = num_guesses * 2
+
+      return scores
+
+   def play_games_batched(self,player,targets,seeds,num_guesses,batch_size):
+      """Plays the games of the given targets in lockstep batches of batch_size, yields the score and running time
+      (the batch time shared evenly) of each"""
+
+      for k in range(0, len(targets), batch_size):
+         batch = targets[k:k+batch_size]
+         seed_game(seeds[k])
+         start = time.time()
+         scores = self.play_batch(player,batch,num_guesses)
+         end = time.time()
+         for score in scores:
+            yield score, (end - start) / len(batch)
+
+   def play_games(self,player,targets,seeds,num_guesses):
+      """Plays the games of the given targets one after another, yields the score and running time of each"""
+
+      for game_count, (target, game_seed) in enumerate(zip(targets, seeds)):
+         if self.verbose:
+            print("Round %d/%d" % (game_count+1,len(targets)))
+
+         seed_game(game_seed)
+         start = time.time()
+         score = self.play(player,target=target,num_guesses=num_guesses)
+         end = time.time()
+         yield score, end - start
+
+   def play_games_parallel(self,agentFile,targets,seeds,num_guesses,num_workers,seed,batch_size=1,player=None):
+      """Plays the games of the given targets on a pool of worker processes, each with its own agent, yields the
+      score and running time of each game in the order of the targets
+
+            :param player: a Player already set up in this process, or None; with a player the workers are forked
+                           from this process (as from a fork server) and each starts with a copy of its agent
+                           instead of creating one
+      """
+
+      if not os.path.exists(agentFile):
+         self.throwError("Error! Agent file '%s' not found" % agentFile)
+
+      # Several shards per worker keep the workers busy to the end and the progress output flowing
+      shard_size = max(1, int(np.ceil(len(targets) / (num_workers * 4))))
+      shards = [(targets[k:k+shard_size], seeds[k:k+shard_size]) for k in range(0, len(targets), shard_size)]
+
+      context = multiprocessing
+      if player is not None:
+         context = multiprocessing.get_context('fork')
+         _worker['player'] = player
 
       try:
-         player = Player(playerFile=agentFile,code_length=self.code_length,colours=list(self.colours),num_guesses=num_guesses)
+         with context.Pool(processes=num_workers, initializer=_init_worker,
+                           initargs=(agentFile, self.code_length, list(self.colours), num_guesses, seed, batch_size,
+                                     profiler.active_profiler() is not None)) as pool:
+            for results, shard_metrics, shard_profile in pool.imap(_play_shard, shards):
+               self.metrics.merge(shard_metrics)
+               if shard_profile is not None:
+                  profiler.active_profiler().merge(shard_profile)
+               for result in results:
+                  yield result
+      finally:
+         _worker.pop('player', None)
+
+   def play_games_remote(self,pool,targets,seeds,num_guesses):
+      """Plays the games of the given targets on the agent processes of an AgentPool (see agent_worker.py), one game
+      per process at a time, yields the score and running time of each game in the order of the targets"""
+
+      free_players = queue.Queue()
+      for player in pool.players:
+         free_players.put(player)
+
+      def play_remote(target, game_seed):
+         player = free_players.get()
+         try:
+            player.agent.seed(game_seed)
+            start = time.time()
+            score = self.play(player,target=target,num_guesses=num_guesses)
+            return score, time.time() - start
+         finally:
+            free_players.put(player)
+
+      with concurrent.futures.ThreadPoolExecutor(max_workers=len(pool.players)) as executor:
+         for result in executor.map(play_remote, targets, seeds):
+            yield result
+
+   def evaluate_exhaustive(self,agentFile,num_guesses,seed=0):
+      """ Scores the agent in agentFile against every possible target by walking its decision tree
+
+            :param seed: the random generators are seeded with it before the agent is created
+
+            :return: a dictionary with the exact average score, the number of targets with each score and the
+                     number of tree nodes (distinct histories, each an AgentFunction call)
+
+            Targets with the same history so far get the same next guess from a deterministic agent, so the agent
+            is asked for each guess once per node and the targets of the node are split by their feedback to it.
+            The agent continues into each split from a shallow copy (copy.copy) of its state after the guess,
+            which needs an AgentFunction that replaces its state attributes rather than changing them in place
+            (as the agents playing batches with AgentFunctionBatch do).  Agents drawing random numbers draw them
+            in the order of the walk, so only a deterministic agent's score is exact.
+      """
+
+      colours = np.array(self.colours)
+      seed_game(seed)
+      try:
+         player = Player(playerFile=agentFile,code_length=self.code_length,colours=list(colours),num_guesses=num_guesses)
       except Exception as e:
          self.throwError(str(e))
 
-      all_boards = (num_games, self.code_length)
+      self.load_feedback_table()
 
-      self.colours = np.array(self.colours)
+      codes = gen_codes(len(colours), self.code_length)
+      solved = encode_feedback(self.code_length, 0, self.code_length)
+      score_counts = {}
+      num_nodes = 0
 
-      I = rnd.randint(0,len(self.colours),size=(all_boards))
+      # Depth-first walk over (agent, percepts, indices of the targets with this history) nodes
+      percepts = (0, np.zeros(shape=(self.code_length)).astype('uint8'), 0, 0)
+      stack = [(player.agent, percepts, np.arange(len(codes)))]
+      while stack:
+         agent, percepts, targets = stack.pop()
+         guess_number = percepts[0] + 1
+         num_nodes += 1
+
+         try:
+            actions = agent.AgentFunction(percepts)
+         except Exception as e:
+            self.throwError(str(e))
+
+         if actions is None:
+            score_counts[num_guesses * 2] = score_counts.get(num_guesses * 2, 0) + len(targets)
+            continue
+         if len(actions) != self.code_length:
+            self.throwError("Error! AgentFunction from '%s.py' did return a list with %d items (expecting %d items)."
+                            % (player.playerFile, len(actions), self.code_length))
+         try:
+            guess_code = encode_codes(actions, colours)
+         except ValueError as e:
+            self.throwError(str(e))
+
+         if self.feedback_table is not None:
+            feedback = self.feedback_table[code_indices(guess_code, len(colours))[0], targets]
+         else:
+            in_place, in_colour = evaluate_guesses(guess_code, codes[targets], len(colours))
+            feedback = encode_feedback(in_place, in_colour, self.code_length)[0]
+         children = []
+         for fb in np.unique(feedback):
+            fb_targets = targets[feedback == fb]
+            if fb == solved:
+               score = guess_number
+            elif guess_number >= num_guesses:
+               score = num_guesses * 2
+            else:
+               fb_in_place, fb_in_colour = decode_feedback(fb, self.code_length)
+               children.append(((guess_number, actions, int(fb_in_place), int(fb_in_colour)), fb_targets))
+               continue
+            score_counts[score] = score_counts.get(score, 0) + len(fb_targets)
+
+         # The last child takes the agent over, the others get copies
+         for k, (child_percepts, fb_targets) in enumerate(children):
+            child_agent = agent if k == len(children) - 1 else copy.copy(agent)
+            stack.append((child_agent, child_percepts, fb_targets))
+
+      total = sum(score * count for score, count in score_counts.items())
+      return {'average_score': total / len(codes), 'score_counts': dict(sorted(score_counts.items())),
+              'num_targets': len(codes), 'num_nodes': num_nodes}
+
+   def gen_targets(self,num_games,seed):
+      """Returns the targets of a run (arrays of colours) and the seeds of its games, both derived from the run seed"""
+
+      rnd = np.random.RandomState(seed)
+      colours = np.array(self.colours)
+
+      all_boards = (num_games, self.code_length)
+      I = rnd.randint(0,len(colours),size=(all_boards))
+      targets = [colours[i] for i in I]
+      return targets, game_seeds(seed, num_games)
+
+   def report_games(self,results,num_games):
+      """Records and reports the (score, running time) of each game as results yields them, returns the total
+      score and the number of games"""
 
       score = 0
       game_count = 0
       tot_time = 0
-      for i in I:
-         if self.verbose:
-            print("Round %d/%d" % (game_count+1,len(I)))
-
-         start = time.time()
-         score += self.play(player,target=self.colours[i],num_guesses=num_guesses)
-         end = time.time()
+      for game_score, game_time in results:
+         score += game_score
          game_count += 1
+         self.metrics.record_game(game_score, game_time)
          print("Average score after game %d: %.2f" % (game_count,score/(game_count)))
-         tot_time += end - start
+         tot_time += game_time
 
          if game_count < num_games:
             avg_time = tot_time / game_count
@@ -283,7 +773,177 @@ class MastermindGame:
          else:
             print("Total running time %s." % (time_to_str(tot_time)))
 
+      return score, game_count
+
+   def run(self,agentFile='agent_human.py',num_guesses=6, num_games=1000,seed=None,num_workers=1,batch_size=1,
+           metrics_file=None,fork_server=False,agent_processes=0,move_timeout=None,profile_file=None):
+      """ Plays num_games games of the agent in agentFile against random targets and reports the average score
+
+            :param num_workers: number of worker processes to play the games on, 1 plays them in this process
+
+                   batch_size: number of games played in lockstep in this process (see play_batch), 1 plays them
+                               one after another
+
+                   metrics_file: file to append the run's latency statistics to (see RunMetrics.write), or None
 
+                   fork_server: with several workers, whether to create and warm up (see Player.warm_up) one agent
+                                in this process and fork the workers from it, so that the agent's setup is paid
+                                once rather than by every worker (needs the 'fork' start method, not on Windows)
+
+                   agent_processes: number of agent worker processes (see agent_worker.py) to play the games on
+                                    concurrently, 0 runs the agent in the engine (num_workers is then ignored)
+
+                   move_timeout: with agent processes, the most seconds an agent may take for a move, a process
+                                 that takes longer is restarted and the move fails (None for no limit)
+
+                   profile_file: file to write the agent's phase timings to in collapsed-stack format (see
+                                 profiler.py), or None not to profile; agents in agent processes are not profiled
+
+            The latency of the agent constructor and warm-up and of every AgentFunction call is collected in
+            self.metrics.
+
+            :return: the average score
+
+            The random and numpy.random generators are seeded from the run seed before the agent is created and
+            from the run seed and the game number before each game, so with the same seed a run scores the same for
+            any number of workers.
+      """
+
+      if self.verbose:
+         print("Game play:")
+         print("  Num guesses:      %d" % num_guesses)
+         print("  Num rounds:       %d" % num_games)
+
+      if seed is None:
+         seed = int(time.time())
+
+      self.metrics = RunMetrics()
+
+      if profile_file is not None and agent_processes > 0:
+         print("Warning! Agents in agent processes are not profiled")
+         profile_file = None
+      if profile_file is not None:
+         profiler.enable()
+
+      if fork_server and 'fork' not in multiprocessing.get_all_start_methods():
+         print("Warning! Workers can't be forked on this platform, each worker will set up its own agent")
+         fork_server = False
+
+      player = None
+      pool = None
+      if agent_processes > 0:
+         from agent_worker import AgentPool
+         try:
+            pool = AgentPool(agentFile,self.code_length,list(self.colours),num_guesses,agent_processes,seed=seed,
+                             timeout=move_timeout)
+         except Exception as e:
+            self.throwError(str(e))
+         for remote_player in pool.players:
+            self.metrics.record_init(remote_player.init_time)
+      elif num_workers <= 1 or fork_server:
+         seed_game(seed)
+         try:
+            player = Player(playerFile=agentFile,code_length=self.code_length,colours=list(self.colours),num_guesses=num_guesses)
+            # The agent's setup is timed with its constructor rather than with its first move
+            player.warm_up()
+         except Exception as e:
+            self.throwError(str(e))
+         self.metrics.record_init(player.init_time)
+
+      self.colours = np.array(self.colours)
+      self.load_feedback_table()
+
+      targets, seeds = self.gen_targets(num_games, seed)
+
+      if pool is not None:
+         results = self.play_games_remote(pool,targets,seeds,num_guesses)
+      elif num_workers <= 1 and batch_size > 1:
+         results = self.play_games_batched(player,targets,seeds,num_guesses,batch_size)
+      elif num_workers <= 1:
+         results = self.play_games(player,targets,seeds,num_guesses)
+      else:
+         results = self.play_games_parallel(agentFile,targets,seeds,num_guesses,num_workers,seed,batch_size,player)
+
+      try:
+         score, game_count = self.report_games(results, num_games)
+      finally:
+         if pool is not None:
+            pool.close()
+         phase_profiler = profiler.disable()
+
+      if self.verbose:
+         self.metrics.print_summary()
+
+      if profile_file is not None:
+         if self.verbose:
+            phase_profiler.print_summary()
+         phase_profiler.write_collapsed(profile_file)
+
+      if metrics_file is not None:
+         self.metrics.write(metrics_file, {'agent': agentFile, 'code_length': self.code_length,
+                                           'num_colours': len(self.colours), 'num_guesses': num_guesses,
+                                           'seed': seed, 'num_workers': num_workers, 'batch_size': batch_size,
+                                           'fork_server': fork_server, 'agent_processes': agent_processes,
+                                           'move_timeout': move_timeout})
+
+      return score / max(game_count, 1)
+
+
+def game_seeds(seed, num_games):
+   """Returns the seeds of the games of a run, derived from the run seed"""
+
+   return np.random.SeedSequence(seed).generate_state(num_games)
+
+def seed_game(game_seed):
+   """Seeds the random generators an agent may use before a game"""
+
+   random.seed(int(game_seed))
+   np.random.seed(int(game_seed))
+
+# State of a worker process of MastermindGame.play_games_parallel
+_worker = {}
+
+def _init_worker(agentFile,code_length,colours,num_guesses,seed,batch_size,profile=False):
+   if profile:
+      profiler.enable()
+   game = MastermindGame(code_length=code_length,num_colours=len(colours))
+   game.colours = np.array(colours)
+   game.load_feedback_table()
+   game.metrics = RunMetrics()
+   _worker['game'] = game
+
+   # Workers forked from a fork server already have its player (whose setup the engine has recorded)
+   if 'player' not in _worker:
+      seed_game(seed)
+      try:
+         _worker['player'] = Player(playerFile=agentFile,code_length=code_length,colours=colours,num_guesses=num_guesses)
+         _worker['player'].warm_up()
+         game.metrics.record_init(_worker['player'].init_time)
+      except Exception as e:
+         # Raised from _play_shard, an exception in the initializer would make the pool restart the worker forever
+         _worker['error'] = str(e)
+   _worker['num_guesses'] = num_guesses
+   _worker['batch_size'] = batch_size
+
+def _play_shard(shard):
+   if 'error' in _worker:
+      raise RuntimeError(_worker['error'])
+
+   targets, seeds = shard
+   game = _worker['game']
+   if _worker['batch_size'] > 1:
+      results = list(game.play_games_batched(_worker['player'],targets,seeds,_worker['num_guesses'],
+                                             _worker['batch_size']))
+   else:
+      results = list(game.play_games(_worker['player'],targets,seeds,_worker['num_guesses']))
+
+   # The latencies and phase timings measured in this worker go back with the results, the engine records the game results
+   shard_metrics = game.metrics
+   game.metrics = RunMetrics()
+   shard_profile = profiler.active_profiler()
+   if shard_profile is not None:
+      profiler.enable()
+   return results, shard_metrics, shard_profile
 
 
 if __name__ == "__main__":
@@ -292,10 +952,28 @@ if __name__ == "__main__":
                          num_colours=game_settings['numberOfColours'],
                          verbose=game_settings['verbose'])
 
+   if game_settings['exhaustive']:
+      start = time.time()
+      result = game.evaluate_exhaustive(agentFile=game_settings['agentFile'],
+                                        num_guesses=game_settings['maxNumberOfGuesses'],
+                                        seed=game_settings['seed'] or 0)
+      print("Average score over all %d codes: %.4f" % (result['num_targets'], result['average_score']))
+      for score, count in result['score_counts'].items():
+         print("   score %2d: %6d codes" % (score, count))
+      print("%d decision tree nodes in %s." % (result['num_nodes'], time_to_str(time.time() - start)))
+      sys.exit(0)
+
    game.run(agentFile=game_settings['agentFile'],
          num_guesses=game_settings['maxNumberOfGuesses'],
          num_games=game_settings['totalNumberOfGames'],
-         seed=game_settings['seed'])
+         seed=game_settings['seed'],
+         num_workers=game_settings['numberOfWorkers'],
+         batch_size=game_settings['batchSize'],
+         metrics_file=game_settings['metricsFile'],
+         fork_server=game_settings['forkServer'],
+         agent_processes=game_settings['agentProcesses'],
+         move_timeout=game_settings['moveTimeout'],
+         profile_file=game_settings['profileFile'])
 
 
 
@@ -0,0 +1,129 @@
+__author__ = "Guangjie Guo"
+__organization__ = "COSC343/AIML402, University of Otago"
+__email__ = "guo_guangjie@163.com"
+
+import os
+import csv
+import json
+import time
+import numpy as np
+
+PERCENTILES = (50, 95, 99)
+
+
+def latency_summary(times):
+   """Returns count, mean, p50/p95/p99 and max (in seconds) of a list of latencies"""
+
+   times = np.asarray(times, dtype='float64')
+   summary = {'count': int(len(times))}
+   if len(times) == 0:
+      return summary
+   summary['mean'] = float(np.mean(times))
+   for p, value in zip(PERCENTILES, np.percentile(times, PERCENTILES)):
+      summary['p%d' % p] = float(value)
+   summary['max'] = float(np.max(times))
+   return summary
+
+
+class RunMetrics:
+   """
+             Latencies and game results collected by MastermindGame during a run
+
+             ...
+
+             Attributes
+             ----------
+             init_times: list of float
+                 the time taken by each agent constructor
+             move_times : dict
+                 the times of the AgentFunction calls of each guess number (1 for the first guess)
+             candidates : dict
+                 the candidate-set sizes the agent reported after each guess number
+             scores : list of int
+                 the score of each game
+             game_times : list of float
+                 the running time of each game
+             """
+
+   def __init__(self):
+      self.init_times = []
+      self.move_times = {}
+      self.candidates = {}
+      self.scores = []
+      self.game_times = []
+
+   def record_init(self, seconds):
+      self.init_times.append(seconds)
+
+   def record_move(self, guess_number, seconds, num_candidates=None):
+      self.move_times.setdefault(guess_number, []).append(seconds)
+      if num_candidates is not None:
+         self.candidates.setdefault(guess_number, []).append(int(num_candidates))
+
+   def record_game(self, score, seconds):
+      self.scores.append(score)
+      self.game_times.append(seconds)
+
+   def merge(self, other):
+      """Adds the measurements of another RunMetrics (e.g. of a worker process) to these"""
+
+      self.init_times += other.init_times
+      for guess_number, times in other.move_times.items():
+         self.move_times.setdefault(guess_number, []).extend(times)
+      for guess_number, sizes in other.candidates.items():
+         self.candidates.setdefault(guess_number, []).extend(sizes)
+      self.scores += other.scores
+      self.game_times += other.game_times
+
+   def summary(self):
+      """Returns a dictionary of the run's statistics, with a latency summary for each guess number"""
+
+      moves = {}
+      for guess_number in sorted(self.move_times):
+         moves[guess_number] = latency_summary(self.move_times[guess_number])
+         if guess_number in self.candidates:
+            moves[guess_number]['mean_candidates'] = float(np.mean(self.candidates[guess_number]))
+
+      return {'num_games': len(self.scores),
+              'average_score': float(np.mean(self.scores)) if self.scores else None,
+              'init': latency_summary(self.init_times),
+              'game': latency_summary(self.game_times),
+              'all_moves': latency_summary([t for times in self.move_times.values() for t in times]),
+              'moves': moves}
+
+   def print_summary(self):
+      print("Latency per guess (ms):")
+      print("  guess  count      p50      p95      p99      max  candidates")
+      for guess_number, stats in self.summary()['moves'].items():
+         print("  %5d %6d %8.2f %8.2f %8.2f %8.2f  %s" % (
+            guess_number, stats['count'], stats['p50']*1e3, stats['p95']*1e3, stats['p99']*1e3, stats['max']*1e3,
+            "%.1f" % stats['mean_candidates'] if 'mean_candidates' in stats else "-"))
+
+   def write(self, path, run_info):
+      """ Appends the run's statistics to a metrics file
+
+            :param path: a .csv file gets one row per guess number, any other file gets one JSON line per run
+
+                   run_info: a dictionary describing the run (agent, board, seed, ...), written with the statistics
+      """
+
+      summary = self.summary()
+      record = dict(run_info, timestamp=time.strftime('%Y-%m-%dT%H:%M:%S'))
+
+      if path.lower().endswith('.csv'):
+         fields = list(record) + ['num_games', 'average_score', 'init_mean', 'guess', 'count', 'mean'] + \
+                  ['p%d' % p for p in PERCENTILES] + ['max', 'mean_candidates']
+         write_header = not os.path.exists(path) or os.path.getsize(path) == 0
+         with open(path, 'a', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            if write_header:
+               writer.writeheader()
+            for guess_number, stats in summary['moves'].items():
+               row = dict(record, num_games=summary['num_games'], average_score=summary['average_score'],
+                          init_mean=summary['init'].get('mean'), guess=guess_number)
+               row.update(stats)
+               writer.writerow(row)
+      else:
+         record.update(summary)
+         with open(path, 'a') as f:
+            f.write(json.dumps(record) + "\n")
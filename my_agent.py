@@ -2,122 +2,412 @@ __author__ = "Guangjie Guo"
 __organization__ = "COSC343/AIML402, University of Otago"
 __email__ = "guo_guangjie@163.com"
 
+import time
+import threading
 import numpy as np
-import random
-from mastermind import evaluate_guess
+from mastermind import evaluate_guesses, encode_codes, decode_codes, encode_feedback, decode_feedback, \
+   code_indices, gen_codes, num_feedbacks, colour_histograms
+from scoring import partition_sizes, partition_scores
+from symmetry import representatives
+from lazy_candidates import sample_consistent_codes
+from feedback_table import load_feedback_table
+from opening_book import load_opening_book
+from strategy_tree import load_strategy_tree, path_key
+from history_cache import HistoryCache, history_key
+from candidate_index import CandidateIndex, POPCOUNT_MIN_FRACTION, to_bitset
+from profiler import phase, profiled
+from settings import agent_settings
 
+# Below this many candidates scoring them all is cheaper than finding their symmetry classes
+SYMMETRY_MIN_CANDIDATES = 256
 
-def gen_best_guess_partially(candidates, n=50):
+# Peak memory in bytes per (guess, candidate) pair while a chunk of guesses is scored: the feedback matrix, the
+# temporaries of evaluate_guesses and the int64 keys partition_sizes counts
+SCORING_BYTES_PER_PAIR = 16
 
-   #randomly generate n guesses
-   random_elements = random.sample(candidates, n)
+# State of the agents of this process that doesn't depend on the game (corpus, opening book, strategy tree, first
+# guess, history cache), keyed by board and settings so that new agents for the same board start warm
+_warm_states = {}
 
-   # generate best guess
-   scores = []
-   for i in range(n):
-      counts = {}
-      for j in range(len(candidates)):
-         my_tuple = tuple(evaluate_guess(random_elements[i],candidates[j]))
-         if my_tuple in counts.keys():
-            counts[my_tuple] += 1
-         else:
-            counts[my_tuple] = 1
-      np_counts = np.array(list(counts.values()))
-      score = np.sum(np_counts * np_counts) / len(candidates)
-      scores.append(score)
-   min_score = min(scores)
-   index = scores.index(min_score)
-   best_guess = random_elements[index]
+# Held while an agent warms up, so that agents warming up on several threads (as in game_server.py) build the state
+# of a board, and the files cached on disk, once
+_warm_lock = threading.Lock()
 
-   return best_guess
+# Codes are held as rows of the corpus, an N x code_length uint8 array of colour indices in the order of
+# gen_codes, and a set of codes (candidates, guesses) is an int32 array of row indices into the corpus.
 
-def gen_best_guess_miniavrg(candidates):
-
-   n = len(candidates)
-   code_length = len(candidates[0])
-   my_array = np.full((n, n, 2), 0)
-   for i in range(n):
-      for j in range(n):
-         if i == j:
-            my_array[i,j] = [code_length, 0]
-         if i < j:
-            my_array[i, j] = evaluate_guess(candidates[i],candidates[j])
-         if i > j:
-            my_array[i, j] = my_array[j, i]
-
-   scores = []
-   for i in range(n):
-      counts = {}
-      for j in range(n):
-         my_tuple = tuple(my_array[i, j])
-         if my_tuple in counts.keys():
-            counts[my_tuple] += 1
-         else:
-            counts[my_tuple] = 1
-      np_counts = np.array(list(counts.values()))
-      score = np.sum(np_counts * np_counts) / n
-      scores.append(score)
 
-   min_score = min(scores)
-   index = scores.index(min_score)
-   best_guess = candidates[index]
+@profiled
+def feedback_matrix(guesses, targets, corpus, num_colours):
+   """ Returns the G x T matrix of encoded feedback of each guess against each target
 
-   return best_guess
+         :param guesses: G-dimensional array of corpus indices
+
+                targets: T-dimensional array of corpus indices
+
+                corpus: the corpus of all codes
+
+                num_colours: the number of colours
+
+         Entries are looked up in the precomputed feedback table when it is available for the board,
+         otherwise they are computed with evaluate_guesses.
+   """
+
+   table = load_feedback_table(corpus.shape[1], num_colours)
+   if table is not None:
+      return table[np.ix_(guesses, targets)]
+
+   in_place, in_colour = evaluate_guesses(corpus[guesses], corpus[targets], num_colours)
+   return encode_feedback(in_place, in_colour, corpus.shape[1])
+
+def partition_counts(guesses, candidates, corpus, num_colours, max_bytes=None, index=None):
+   """ Counts the candidates in each feedback class of each guess (see scoring.partition_sizes)
+
+         :param guesses: array of corpus indices of the guesses
+
+                candidates: array of corpus indices of the candidates
+
+                max_bytes: the memory the scoring may take, agent_settings['scoringMemoryBytes'] when None
+
+                index: a CandidateIndex, the partition sizes of the guesses it has indexed are counted from its
+                       postings when the candidates are a large enough part of the corpus for that to be cheaper
+
+         :return: a G x num_feedbacks int64 array of partition sizes
 
+         The guesses are scored in chunks of rows small enough for the feedback of a chunk to fit in max_bytes,
+         only the partition sizes of each chunk are kept, so memory grows linearly with the number of guesses.
+   """
+
+   if max_bytes is None:
+      max_bytes = agent_settings.get('scoringMemoryBytes', 64 * 2**20)
+   chunk_rows = max(1, int(max_bytes // (SCORING_BYTES_PER_PAIR * max(len(candidates), 1))))
+
+   guesses = np.asarray(guesses)
+   num_fb = num_feedbacks(corpus.shape[1])
+   counts = np.empty((len(guesses), num_fb), dtype='int64')
+   rows = np.arange(len(guesses))
+   if index is not None and len(candidates) >= POPCOUNT_MIN_FRACTION * index.num_codes:
+      with phase('popcount_partition_sizes'):
+         bitset = to_bitset(candidates, index.num_codes)
+         counted = np.zeros(len(guesses), dtype='bool')
+         for i, guess in enumerate(guesses):
+            sizes = index.partition_sizes(guess, bitset)
+            if sizes is not None:
+               counts[i] = sizes
+               counted[i] = True
+         rows = rows[~counted]
+
+   for start in range(0, len(rows), chunk_rows):
+      chunk = rows[start:start + chunk_rows]
+      feedback = feedback_matrix(guesses[chunk], candidates, corpus, num_colours)
+      with phase('partition_sizes'):
+         counts[chunk] = partition_sizes(feedback, num_fb)
+   return counts
+
+def score_guesses(guesses, candidates, corpus, num_colours, criterion='miniavrg', index=None):
+   """ Scores each guess by how it partitions the candidates, by default by the average size of the candidate set
+   left after playing it (min-average)
+
+         :param guesses: array of corpus indices of the guesses to score
+
+                candidates: array of corpus indices of the codes still consistent with the game so far
+
+                criterion: the scoring criterion, see scoring.py
+
+                index: a CandidateIndex to count partition sizes with (see partition_counts), or None
+
+         :return: a numpy array with the score of each guess, lower is better
+   """
+
+   return partition_scores(partition_counts(guesses, candidates, corpus, num_colours, index=index), criterion)
+
+def collision_scores(counts):
+   """ Estimates the miniavrg ranking of guesses from their partition sizes on a random sample of the candidates
+
+         :param counts: a G x F array of partition sizes on a sample of s candidates drawn without replacement
+
+         :return: a tuple of the estimates of sum(p_i^2), the probability that two candidates fall in the same
+                  partition, and their standard errors; miniavrg is 1 + (T - 1) times this probability, so it ranks
+                  guesses the same way
+   """
+
+   s = counts.sum(axis=1)[0]
+   collisions = np.sum(counts * (counts - 1), axis=1) / (s * (s - 1))
+   p = counts / s
+   # the variance of this U-statistic is about 4 (sum(p_i^3) - sum(p_i^2)^2) / s
+   variance = 4 * np.maximum(np.sum(p**3, axis=1) - np.sum(p**2, axis=1)**2, 0) / s
+   return collisions, np.sqrt(variance)
+
+@profiled
+def gen_best_guess_partially(candidates, corpus, num_colours, n=50, criterion='miniavrg', guesses=None,
+                             pool_size=2000, finalists=8, z=3.0):
+   """ Races guesses on growing random samples of the candidates (successive halving) and returns the best of the
+   finalists scored on all candidates, with its feedback against them
+
+         :param n: the budget, as many feedback computations as scoring n guesses on all candidates takes
+
+                pool_size: the number of guesses raced, drawn at random from the guesses if there are more
+
+                finalists: the number of guesses scored on all candidates
+
+                z: with the miniavrg criterion, guesses whose estimated score is more than z standard errors worse
+                   than the best one's are dropped early
+
+         Each round scores the remaining guesses on the next slice of one random permutation of the candidates, so
+         the partition sizes on the sample grow from round to round, and keeps the better half of them, less the
+         ones confidently worse than the best.  The first sample is sized so that the rounds and the finalists
+         take about the budget.
+   """
+
+   if guesses is None:
+      guesses = candidates
+   pool = guesses
+   if len(pool) > pool_size:
+      pool = np.random.choice(guesses, size=pool_size, replace=False)
+
+   num_candidates = len(candidates)
+   rounds = max(int(np.ceil(np.log2(max(len(pool), 1) / finalists))), 0)
+   sample_size = int(2 * max(n - finalists, 1) * num_candidates / (len(pool) * (rounds + 1)))
+   sample_size = min(max(sample_size, 32), num_candidates)
+
+   order = candidates[np.random.permutation(num_candidates)]
+   counts = partition_counts(pool, order[:sample_size], corpus, num_colours)
+   scored = sample_size
+   while len(pool) > finalists and scored < num_candidates:
+      if criterion == 'miniavrg':
+         scores, errors = collision_scores(counts)
+         best = np.argmin(scores)
+         keep = scores - scores[best] <= z * np.sqrt(errors**2 + errors[best]**2)
+      else:
+         scores = partition_scores(counts, criterion)
+         keep = np.ones(len(pool), dtype='bool')
+
+      # the better half, less the guesses confidently worse than the best one (stable, for ties)
+      survivors = np.argsort(scores, kind='stable')[:max(finalists, (len(pool) + 1) // 2)]
+      survivors = np.sort(survivors[keep[survivors]])
+      pool, counts = pool[survivors], counts[survivors]
+
+      grown = min(2 * scored, num_candidates) if len(pool) > finalists else num_candidates
+      counts = counts + partition_counts(pool, order[scored:grown], corpus, num_colours)
+      scored = grown
+
+   if scored < num_candidates:
+      counts = counts + partition_counts(pool, order[scored:], corpus, num_colours)
+   best_guess = pool[np.argmin(partition_scores(counts, criterion))]
+
+   return best_guess, feedback_matrix([best_guess], candidates, corpus, num_colours)[0]
+
+@profiled
+def gen_best_guess_miniavrg(candidates, corpus, num_colours, criterion='miniavrg', guesses=None, index=None):
+
+   if guesses is None:
+      guesses = candidates
+   scores = score_guesses(guesses, candidates, corpus, num_colours, criterion, index=index)
+   best_guess = guesses[np.argmin(scores)]
+
+   return best_guess, feedback_matrix([best_guess], candidates, corpus, num_colours)[0]
+
+@profiled
+def gen_best_guess_anytime(candidates, corpus, num_colours, deadline, criterion='miniavrg', max_chunk_rows=256,
+                           guesses=None):
+   """ Scores the candidates as guesses in chunks until the deadline, returns the best guess scored so far and its
+   feedback against the candidates
+
+         :param candidates: array of corpus indices of the codes still consistent with the game so far
+
+                deadline: the time.perf_counter() time by which to return
+
+                guesses: array of corpus indices of the guesses to choose from, the candidates when None
+
+                max_chunk_rows: the largest number of guesses scored at once
+
+         Guesses with more distinct colours tend to split the candidates more, so they are scored first (in
+         random order within the same number of colours).  The first chunk is always scored; after that a
+         chunk is only started if it is expected to finish before the deadline, judging by the time per guess
+         measured so far.
+   """
+
+   if guesses is None:
+      guesses = candidates
+   distinct_colours = np.count_nonzero(colour_histograms(corpus[guesses], num_colours), axis=1)
+   order = np.random.permutation(len(guesses))
+   order = order[np.argsort(-distinct_colours[order], kind='stable')]
+
+   best_guess = None
+   best_score = np.inf
+   chunk_rows = min(4, max_chunk_rows)
+   start = 0
+   while start < len(order):
+      chunk_start = time.perf_counter()
+      chunk = guesses[order[start:start + chunk_rows]]
+      scores = score_guesses(chunk, candidates, corpus, num_colours, criterion)
+      if scores.min() < best_score:
+         best_score = scores.min()
+         best_guess = chunk[np.argmin(scores)]
+      start += len(chunk)
+
+      now = time.perf_counter()
+      time_per_row = (now - chunk_start) / len(chunk)
+      chunk_rows = int(min(max_chunk_rows, (deadline - now) / max(time_per_row, 1e-9)))
+      if chunk_rows < 1:
+         break
+
+   return best_guess, feedback_matrix([best_guess], candidates, corpus, num_colours)[0]
+
+def split_lower_bound(sizes, num_feedbacks):
+   """ Returns a lower bound of best_split for candidate sets of the given sizes: the sum of squared partition sizes
+   is smallest when the candidates are split as evenly as possible over all feedbacks, one of them being solved"""
+
+   q, r = np.divmod(sizes, num_feedbacks)
+   return np.maximum(r * (q + 1)**2 + (num_feedbacks - r) * q**2 - 1, 0)
+
+@profiled
+def best_split(candidates, corpus, num_colours, table=None, max_table_size=100000):
+   """ Returns the smallest sum of squared partition sizes a guess from the candidates splits them into, not counting
+   the solved partition (the game ends there); divided by the number of candidates this is the expected number of
+   candidates left after the guess
+
+         :param candidates: array of corpus indices of the candidates, in increasing order
+
+                table: a transposition table (dictionary) of values already computed, keyed by candidate set, or None
+
+                max_table_size: the table is cleared when it grows beyond this many entries
+   """
+
+   if len(candidates) <= 2:
+      return max(len(candidates) - 1, 0)
+
+   # A single get, the table may be shared by agents on other threads and cleared between a test and a read
+   key = candidates.tobytes()
+   value = table.get(key) if table is not None else None
+   if value is not None:
+      return value
+
+   counts = partition_counts(candidates, candidates, corpus, num_colours)
+   value = int(np.min(np.sum(counts * counts, axis=1))) - 1
+
+   if table is not None:
+      if len(table) >= max_table_size:
+         table.clear()
+      table[key] = value
+   return value
+
+@profiled
+def gen_best_guess_lookahead(candidates, corpus, num_colours, deadline, guesses=None, table=None):
+   """ Picks the guess that leaves the fewest candidates on average after it and the best guess after it (two-ply
+   min-average)
+
+         :param candidates: array of corpus indices of the codes still consistent with the game so far
+
+                deadline: the time.perf_counter() time after which no more guesses are looked ahead from
+
+                guesses: array of corpus indices of the guesses to choose from, the candidates when None
+
+                table: the transposition table of best_split, or None
+
+         :return: the best guess, its feedback against the candidates, and whether all the guesses were looked
+                  ahead from (or pruned) before the deadline
+
+         Guesses are looked ahead from in order of their one-ply score, the best one always.  A guess is pruned as
+         soon as the value of its partitions looked ahead so far plus the lower bounds (see split_lower_bound) of
+         the others reaches the best value found.
+   """
+
+   if guesses is None:
+      guesses = candidates
+   code_length = corpus.shape[1]
+   num_fb = num_feedbacks(code_length)
+
+   counts = partition_counts(guesses, candidates, corpus, num_colours)
+   scores = partition_scores(counts)
+   counts[:, encode_feedback(code_length, 0, code_length)] = 0
+   bounds = np.sum(split_lower_bound(counts, num_fb), axis=1)
+
+   best = None
+   best_feedback = None
+   best_value = np.inf
+   complete = True
+   for i in np.argsort(scores, kind='stable'):
+      if bounds[i] >= best_value:
+         continue
+      if best is not None and time.perf_counter() > deadline:
+         complete = False
+         break
+
+      feedback = feedback_matrix([guesses[i]], candidates, corpus, num_colours)[0]
+      sorted_candidates, offsets = partition_candidates(feedback, candidates, code_length)
+      value = 0
+      remaining_bound = bounds[i]
+      for fb in np.flatnonzero(counts[i]):
+         remaining_bound -= split_lower_bound(counts[i, fb], num_fb)
+         value += best_split(sorted_candidates[offsets[fb]:offsets[fb + 1]], corpus, num_colours, table)
+         if value + remaining_bound >= best_value:
+            break
+      else:
+         best = i
+         best_feedback = feedback
+         best_value = value
+
+   return guesses[best], best_feedback, complete
+
+@profiled
 def gen_corpus(colours, code_length):
-   corpus = []
-   numcolours = len(colours)
-   for i in range(numcolours ** code_length):
-      ele = [0] * code_length
-      decimal_num = i
-      k = 1
-      while decimal_num > 0:
-         remainder = decimal_num % numcolours
-         ele[code_length - k] = remainder
-         decimal_num //= numcolours
-         k += 1
-      ele_chars = []
-      for j in range(code_length):
-         ele_chars.append(colours[ele[j]])
-      corpus.append(ele_chars)
-   return corpus
-
-def gen_first_guess(colours, code_length, n = 10):
-
-   # generate corpus of all candidates
-   corpus = gen_corpus(colours, code_length)
-
-   # randomly choose 10 candidates
-   candidates = []
-   for i in range(n):
-      candidates.append(np.random.choice(colours, size=(code_length)))
+   return gen_codes(len(colours), code_length)
+
+@profiled
+def gen_first_guess(corpus, num_colours, n = 10, criterion='miniavrg', rng=np.random):
+
+   # one guess of each symmetry class of the empty board (a handful), a random n of them if there are more
+   candidates = representatives(np.arange(len(corpus)), corpus, [], num_colours)
+   if len(candidates) > n:
+      candidates = rng.choice(candidates, size=n, replace=False)
 
    # generate best guess
-   scores = []
-   for i in range(n):
-      counts = {}
-      for j in range(len(corpus)):
-         my_tuple = tuple(evaluate_guess(candidates[i],corpus[j]))
-         if my_tuple in counts.keys():
-            counts[my_tuple] += 1
-         else:
-            counts[my_tuple] = 1
-      np_counts = np.array(list(counts.values()))
-      score = np.sum(np_counts * np_counts) / len(corpus)
-      scores.append(score)
-   min_score = min(scores)
-   index = scores.index(min_score)
-   best_guess = candidates[index]
+   scores = score_guesses(candidates, np.arange(len(corpus)), corpus, num_colours, criterion)
+   best_guess = candidates[np.argmin(scores)]
 
    return best_guess
 
-def find_candidates(last_guess, in_place, in_colour, pre_candidates):
-   candidates = []
-   for i in range(len(pre_candidates)):
-      in_place1, in_colour1 = evaluate_guess(last_guess, pre_candidates[i])
-      if in_place1 == in_place and in_colour1 == in_colour:
-         candidates.append(pre_candidates[i])
-   return candidates
+@profiled
+def partition_candidates(feedback, candidates, code_length):
+   """ Groups the candidates by their feedback to a guess, so that the candidates left after any feedback can be
+   looked up (see partition_lookup) instead of filtered
+
+         :param feedback: the encoded feedback of the guess against each candidate
+
+                candidates: array of corpus indices of the candidates
+
+         :return: a tuple of the candidates sorted by feedback (in their order within the same feedback) and the
+                  offsets of each feedback in them
+   """
+
+   # A stable sort of uint8 keys is a radix sort, linear in the number of candidates
+   order = np.argsort(feedback, kind='stable')
+   offsets = np.zeros(num_feedbacks(code_length) + 1, dtype='int64')
+   offsets[1:] = np.cumsum(np.bincount(feedback, minlength=num_feedbacks(code_length)))
+   return candidates[order], offsets
+
+@profiled
+def partition_lookup(partition, in_place, in_colour, code_length):
+   """Returns the candidates of a partition (see partition_candidates) with the given feedback, as a view"""
+
+   sorted_candidates, offsets = partition
+   feedback = encode_feedback(in_place, in_colour, code_length)
+   return sorted_candidates[offsets[feedback]:offsets[feedback + 1]]
+
+@profiled
+def find_candidates(last_guess, in_place, in_colour, pre_candidates, corpus, num_colours):
+   """ Returns the candidates consistent with the feedback to the last guess
+
+         :param last_guess: corpus index of the last guess
+
+                pre_candidates: array of corpus indices of the previous candidates
+
+         :return: array of corpus indices of the remaining candidates
+   """
+
+   feedback = feedback_matrix([last_guess], pre_candidates, corpus, num_colours)[0]
+   return pre_candidates[feedback == encode_feedback(in_place, in_colour, corpus.shape[1])]
 
 
 class MastermindAgent():
@@ -153,14 +443,198 @@ class MastermindAgent():
       self.colours = colours
       self.num_guesses = num_guesses
 
-      # save last candidates
-      self.pre_candidates = []
+      # save last candidates, the guesses and feedbacks of the game so far and the key of the feedback sequence
+      self.pre_candidates = None
+      self.history = []
+      self.path_key = 0
+
+      # the last guess and the partition of the last candidates by their feedback to it (see partition_candidates),
+      # None when the guess was not scored against them
+      self.partition = None
+
+      # the number of candidates left before the last guess, None when it was looked up in the strategy tree
+      self.num_candidates = None
+
+      # the same for each game of a batch played by AgentFunctionBatch, with the history of each as a hashable key
+      self.batch_states = []
+      self.batch_keys = []
+
+      # criterion guesses are scored by (see scoring.py)
+      self.criterion = agent_settings.get('criterion', 'miniavrg')
+
+      # in "lazy" strategy, and on boards too big for the corpus, consistent codes are sampled without a corpus
+      self.strategy = agent_settings.get('strategy', 'miniavrg')
+      self.lazy = self.strategy == 'lazy' or len(colours) ** code_length > agent_settings.get('maxCorpusSize', 10**6)
+      self.lazy_sample_size = agent_settings.get('lazySampleSize', 200)
+
+      # time budget of a move in seconds, None for the fixed sampling threshold
+      self.move_deadline = agent_settings.get('moveDeadline', None)
+
+      # number of moves for which only one guess per symmetry class of the game so far is scored
+      self.symmetry_moves = agent_settings.get('symmetryMoves', 0)
+
+      # with a move deadline, the seconds per candidate finding symmetry classes took last time (measured on a
+      # sample by warm_up at first), moves it would leave less than half of the budget to scoring in skip it
+      self.symmetry_seconds_per_code = None
+
+      # moves with more candidates than this race guesses on samples of them (see gen_best_guess_partially)
+      self.full_scoring_max_candidates = agent_settings.get('fullScoringMaxCandidates', 10000)
+
+      # in "lookahead" strategy, the time budget of looking two guesses ahead and the most candidates to do it for
+      self.lookahead_budget = agent_settings.get('lookaheadBudget', 1.0)
+      self.lookahead_max_candidates = agent_settings.get('lookaheadMaxCandidates', 1000)
+
+      # the corpus, first guess, opening book, strategy tree and history cache are set up by warm_up on first use
+      self.ready = False
+
+   def warm_up(self):
+      """ Sets up the state the agent needs before its first move, if not done yet
+
+            With agent_settings['shareWarmState'] the state is built once per process and board, and later agents
+            take it over as is.  Engines may call this before the first game (e.g. before forking workers) to keep
+            the setup out of the first move.
+            """
+
+      if self.ready:
+         return
+
+      key = (self.code_length, tuple(self.colours), self.lazy, self.strategy, self.criterion)
+      with _warm_lock:
+         state = _warm_states.get(key)
+         if state is None:
+            state = self.build_warm_state()
+            if agent_settings.get('shareWarmState', True):
+               _warm_states[key] = state
+
+      self.corpus = state['corpus']
+      self.all_codes = state['all_codes']
+      self.first_guess = state['first_guess']
+      self.opening_book = state['opening_book']
+      self.strategy_tree = state['strategy_tree']
+      self.history_cache = state['history_cache']
+      self.transposition_table = state['transposition_table']
+      self.candidate_index = state['candidate_index']
+      self.first_partition = state['first_partition']
+      if self.move_deadline is not None and self.symmetry_moves > 0 and not self.lazy:
+         sample = self.all_codes[:SYMMETRY_MIN_CANDIDATES]
+         self.timed_representatives(sample, [self.corpus[self.first_guess]])
+      self.ready = True
+
+   @profiled
+   def build_warm_state(self):
+      """Builds the corpus, first guess, opening book, strategy tree and history cache, returns them in a dictionary"""
+
+      num_colours = len(self.colours)
+
+      # guesses and candidates already found for a game history, kept across games
+      cache_bytes = agent_settings.get('historyCacheBytes', None)
+      state = {'corpus': None, 'all_codes': None, 'opening_book': None, 'strategy_tree': None, 'first_partition': None,
+               'history_cache': HistoryCache(cache_bytes) if cache_bytes else None, 'transposition_table': {},
+               'candidate_index': None}
+
+      if self.lazy:
+         state['first_guess'] = np.array([(i // 2) % num_colours for i in range(self.code_length)], dtype='uint8')
+         return state
 
       # initiate corpus
-      self.corpus = gen_corpus(colours, code_length)
+      state['corpus'] = gen_corpus(self.colours, self.code_length)
+      state['all_codes'] = np.arange(len(state['corpus']), dtype='int32')
+
+      # bitsets of the codes giving each feedback to the guesses played most, for filtering candidates
+      index_bytes = agent_settings.get('candidateIndexBytes', None)
+      if index_bytes:
+         state['candidate_index'] = CandidateIndex(state['corpus'], num_colours, index_bytes,
+                                                   agent_settings.get('candidateIndexMinScans', 2))
+
+      # initiate first guess, the opening book also gives the reply to each feedback to it; the guesses tried for
+      # the first guess are drawn from a generator of their own so that it doesn't depend on when it is built
+      state['opening_book'] = load_opening_book(self.code_length, num_colours, self.criterion)
+      if state['opening_book'] is not None:
+         state['first_guess'] = state['opening_book']['first_guess']
+      else:
+         state['first_guess'] = gen_first_guess(state['corpus'], num_colours, n = 20, criterion=self.criterion,
+                                                rng=np.random.RandomState(len(state['corpus'])))
+
+      # the candidates left after the first guess are looked up in its partition of the corpus
+      feedback = feedback_matrix([state['first_guess']], state['all_codes'], state['corpus'], num_colours)[0]
+      state['first_partition'] = (state['first_guess'],) + partition_candidates(feedback, state['all_codes'],
+                                                                                self.code_length)
+
+      # in "tree" strategy guesses are looked up in the precompiled strategy tree
+      if self.strategy == 'tree':
+         state['strategy_tree'] = load_strategy_tree(self.code_length, num_colours, self.criterion)
+
+      return state
+
+   @profiled
+   def lazy_guess(self):
+      """ Returns the next guess (integer-encoded) of the lazy mode and the sample it was chosen from, the guess
+      is None if no code fits the feedback
+
+            A sample of codes consistent with the game so far is drawn by a backtracking search and the guess is
+            the sample code that best splits the sample, so memory use depends on the sample size only.
+            """
 
-      # initiate first guess
-      self.first_guess = gen_first_guess(colours, code_length, n = 20)
+      history = [(encode_codes(guess, self.colours)[0], guess_in_place, guess_in_colour)
+                 for guess, guess_in_place, guess_in_colour in self.history]
+      sample = sample_consistent_codes(history, self.code_length, len(self.colours), self.lazy_sample_size,
+                                       np.random)
+      if len(sample) == 0:
+         return None, sample
+
+      in_place, in_colour = evaluate_guesses(sample, sample, len(self.colours))
+      counts = partition_sizes(encode_feedback(in_place, in_colour, self.code_length),
+                               num_feedbacks(self.code_length))
+      return sample[np.argmin(partition_scores(counts, self.criterion))], sample
+
+   def cached_guess(self, search):
+      """ Returns the guess and candidates of the game so far, looked up in the history cache when possible, and
+      the guess's feedback against the candidates (None if the guess was looked up)
+
+            :param search: a function of the candidates (None if they are not known yet) returning the guess, the
+                           candidates, whether the guess was chosen without randomness or time limits and the
+                           feedback of the guess (or None)
+
+            Only such deterministic guesses are cached, the candidates are cached with any guess, so that a run
+            scores the same whatever games the cache has seen.
+            """
+
+      if self.history_cache is None:
+         action, candidates, _, feedback = search(None)
+         return action, candidates, feedback
+
+      key = history_key(self.history)
+      cached = self.history_cache.get(key)
+      if cached is not None and cached[0] is not None:
+         return cached[0], cached[1], None
+
+      action, candidates, deterministic, feedback = search(None if cached is None else cached[1])
+      if cached is None:
+         self.history_cache.put(key, action if deterministic else None, candidates)
+      return action, candidates, feedback
+
+   def timed_representatives(self, candidates, history_codes):
+      """Returns the representatives of the symmetry classes of the candidates (see symmetry.representatives),
+      measuring the seconds per candidate they took"""
+
+      start = time.perf_counter()
+      guesses = representatives(candidates, self.corpus, history_codes, len(self.colours))
+      self.symmetry_seconds_per_code = (time.perf_counter() - start) / len(candidates)
+      return guesses
+
+   def symmetry_fits(self, num_candidates, move_start):
+      """Returns whether finding the symmetry classes of num_candidates candidates is expected to leave at least
+      half of the move's budget to scoring, always True without a move deadline"""
+
+      if self.move_deadline is None or self.symmetry_seconds_per_code is None:
+         return True
+      expected_end = time.perf_counter() + num_candidates * self.symmetry_seconds_per_code
+      return expected_end <= move_start + self.move_deadline / 2
+
+   def code_index(self, code):
+      """Returns the corpus index of a code of colour characters"""
+
+      return int(code_indices(encode_codes(code, self.colours), len(self.colours))[0])
 
    def AgentFunction(self, percepts):
       """Returns the next board guess given state of the game in percepts
@@ -184,26 +658,168 @@ class MastermindAgent():
 
       # Extract different parts of percepts.
       guess_counter, last_guess, in_place, in_colour = percepts
+      move_start = time.perf_counter()
+      self.warm_up()
 
-      # selecting from the candidates by using miniavrg method
       if guess_counter == 0:
+         self.history = []
+         self.path_key = 0
+      else:
+         feedback = encode_feedback(in_place, in_colour, self.code_length)
+         self.history = self.history + [(last_guess, in_place, in_colour)]
+         self.path_key = path_key(self.path_key, feedback, self.code_length)
+
+      if self.lazy:
+         if guess_counter == 0:
+            action = self.first_guess
+            self.num_candidates = None
+         else:
+            action, sample = self.lazy_guess()
+            self.num_candidates = len(sample)
+         if action is None:
+            return None
+         return list(decode_codes(action, self.colours))
+
+      # following the strategy tree, feedback sequences it doesn't know fall back to the search below
+      if self.strategy_tree is not None and self.path_key in self.strategy_tree:
+         action = self.strategy_tree[self.path_key]
+         self.pre_candidates = None
+         self.partition = None
+         self.num_candidates = None
+
+      # selecting from the candidates by using miniavrg method, the first two moves come from the opening book
+      elif guess_counter == 0:
          action = self.first_guess
+         self.pre_candidates = None
+         self.partition = self.first_partition
+         self.num_candidates = len(self.corpus)
 
-      elif guess_counter == 1:
-         candidates = find_candidates(last_guess, in_place, in_colour, self.corpus)
-         if len(candidates) > 1000:
-            action = gen_best_guess_partially(candidates, n=100)
-         else:
-            action = gen_best_guess_miniavrg(candidates)
+      else:
+         action, candidates, feedback = self.cached_guess(lambda candidates: self.search_guess(
+            last_guess, in_place, in_colour, move_start, candidates))
          self.pre_candidates = candidates
+         self.partition = None
+         # with a move deadline the partition is only built in time left, the next move filters the candidates
+         # instead
+         if feedback is not None and (self.move_deadline is None
+                                      or time.perf_counter() < move_start + self.move_deadline):
+            self.partition = (action,) + partition_candidates(feedback, candidates, self.code_length)
+         self.num_candidates = len(candidates)
 
+      # Return a guess
+      return list(decode_codes(self.corpus[action], self.colours))
+
+   def filter_candidates(self, guess, feedback, candidates):
+      """Returns the candidates giving feedback to guess (a corpus index), looked up in the candidate index when
+      the guess is indexed"""
+
+      if self.candidate_index is not None:
+         remaining = self.candidate_index.filter(guess, feedback, candidates)
+         if remaining is not None:
+            return remaining
+      in_place, in_colour = decode_feedback(feedback, self.code_length)
+      return find_candidates(guess, in_place, in_colour, candidates, self.corpus, len(self.colours))
+
+   @profiled
+   def replay_candidates(self):
+      """Returns the codes consistent with the whole game so far, the AND of the postings of its indexed guesses
+      filtered by the others"""
+
+      history = [(self.code_index(guess), encode_feedback(guess_in_place, guess_in_colour, self.code_length))
+                 for guess, guess_in_place, guess_in_colour in self.history]
+      if self.candidate_index is None:
+         candidates, rest = self.all_codes, history
       else:
-         candidates = find_candidates(last_guess, in_place, in_colour, self.pre_candidates)
-         if len(candidates) > 1000:
-            action = gen_best_guess_partially(candidates, n=100)
+         candidates, rest = self.candidate_index.consistent(history)
+      for guess, feedback in rest:
+         in_place, in_colour = decode_feedback(feedback, self.code_length)
+         candidates = find_candidates(guess, in_place, in_colour, candidates, self.corpus, len(self.colours))
+      return candidates
+
+   @profiled
+   def search_guess(self, last_guess, in_place, in_colour, move_start, candidates=None):
+      """ Filters the candidates by the last feedback, unless they are given, and searches for the best guess
+
+            :return: the guess, the candidates, whether the guess was chosen deterministically (see cached_guess)
+                     and the feedback of the guess against the candidates (None if it was not scored)
+            """
+
+      guess_counter = len(self.history)
+      feedback = encode_feedback(in_place, in_colour, self.code_length)
+      deterministic = True
+      guess_feedback = None
+      if candidates is None and self.partition is not None and self.partition[0] == self.code_index(last_guess):
+         # the last guess was scored against the last candidates, which are already split by feedback
+         candidates = partition_lookup(self.partition[1:], in_place, in_colour, self.code_length)
+      elif candidates is None and (self.pre_candidates is None or guess_counter == 1):
+         # replay the whole game when the last moves were not searched
+         candidates = self.replay_candidates()
+      elif candidates is None:
+         candidates = self.filter_candidates(self.code_index(last_guess), feedback, self.pre_candidates)
+      if guess_counter == 1 and self.opening_book is not None \
+            and self.code_index(last_guess) == self.first_guess and feedback in self.opening_book['replies']:
+         action = self.opening_book['replies'][feedback]
+      else:
+         guesses = candidates
+         if len(self.history) < self.symmetry_moves and len(candidates) >= SYMMETRY_MIN_CANDIDATES \
+               and self.symmetry_fits(len(candidates), move_start):
+            history_codes = [self.corpus[self.code_index(guess)] for guess, _, _ in self.history]
+            guesses = self.timed_representatives(candidates, history_codes)
+
+         if self.strategy == 'lookahead' and 2 < len(candidates) <= self.lookahead_max_candidates:
+            action, guess_feedback, deterministic = gen_best_guess_lookahead(
+               candidates, self.corpus, len(self.colours), deadline=move_start + self.lookahead_budget,
+               guesses=guesses, table=self.transposition_table)
+         elif self.move_deadline is not None:
+            action, guess_feedback = gen_best_guess_anytime(candidates, self.corpus, len(self.colours),
+                                                            deadline=move_start + self.move_deadline,
+                                                            criterion=self.criterion, guesses=guesses)
+            deterministic = False
+         elif len(candidates) > self.full_scoring_max_candidates:
+            action, guess_feedback = gen_best_guess_partially(candidates, self.corpus, len(self.colours), n=100,
+                                                              criterion=self.criterion, guesses=guesses)
+            deterministic = False
          else:
-            action = gen_best_guess_miniavrg(candidates)
-         self.pre_candidates = candidates
+            action, guess_feedback = gen_best_guess_miniavrg(candidates, self.corpus, len(self.colours),
+                                                             criterion=self.criterion, guesses=guesses,
+                                                             index=self.candidate_index)
+      return action, candidates, deterministic, guess_feedback
 
-      # Return a guess
-      return action
+   def AgentFunctionBatch(self, percepts_batch):
+      """Returns the next board guesses of a batch of games played in lockstep
+
+            :param percepts_batch: a list with the percepts (see AgentFunction) of each game of the batch, None
+                                   for the games that are over
+
+            :return: a list with the next guess of each game, None for the games that are over
+
+            Games with the same history get the same guess, which is searched for only once per round.
+            """
+
+      if len(self.batch_states) != len(percepts_batch):
+         self.batch_states = [(None, None, [], 0)] * len(percepts_batch)
+         self.batch_keys = [()] * len(percepts_batch)
+
+      actions = []
+      decided = {}
+      for g, percepts in enumerate(percepts_batch):
+         if percepts is None:
+            actions.append(None)
+            continue
+
+         guess_counter, last_guess, in_place, in_colour = percepts
+         if guess_counter == 0:
+            key = ()
+         else:
+            key = self.batch_keys[g] + ((tuple(last_guess), in_place, in_colour),)
+
+         if key not in decided:
+            self.pre_candidates, self.partition, self.history, self.path_key = self.batch_states[g]
+            action = self.AgentFunction(percepts)
+            decided[key] = (action, (self.pre_candidates, self.partition, self.history, self.path_key))
+
+         action, self.batch_states[g] = decided[key]
+         self.batch_keys[g] = key
+         actions.append(action)
+
+      return actions
@@ -0,0 +1,102 @@
+__author__ = "Guangjie Guo"
+__organization__ = "COSC343/AIML402, University of Otago"
+__email__ = "guo_guangjie@163.com"
+
+import os
+import threading
+import json
+import numpy as np
+from feedback_table import cache_dir
+from settings import game_settings, agent_settings
+
+# Books already loaded by this process, keyed by (code_length, num_colours, criterion)
+_loaded_books = {}
+
+
+def book_path(code_length, num_colours, criterion='miniavrg'):
+   return os.path.join(cache_dir(), "opening_L%d_C%d_%s.json" % (code_length, num_colours, criterion))
+
+def best_guess(guesses, candidates, corpus, num_colours, criterion='miniavrg'):
+   """Returns the guess with the lowest score under criterion against the candidates, the first one on ties"""
+
+   from my_agent import score_guesses
+
+   return int(guesses[np.argmin(score_guesses(guesses, candidates, corpus, num_colours, criterion))])
+
+def build_opening_book(code_length, num_colours, criterion='miniavrg'):
+   """ Computes the opening book for a board configuration
+
+         The first guess is the best guess under criterion (see scoring.py) over all codes.  For every feedback
+         the first guess can receive, the reply is the best guess among the candidates left, scored against all of
+         them.
+
+         :return: a dictionary with the corpus index of the first guess and a dictionary mapping each encoded
+                  first feedback (see mastermind.encode_feedback) to the corpus index of the reply
+   """
+
+   from my_agent import gen_corpus, feedback_matrix
+   from symmetry import representatives
+
+   corpus = gen_corpus(range(num_colours), code_length)
+   all_codes = np.arange(len(corpus), dtype='int32')
+
+   # Symmetric guesses score the same, scoring one of each symmetry class gives the same guesses
+   first_guess = best_guess(representatives(all_codes, corpus, [], num_colours), all_codes, corpus, num_colours,
+                            criterion)
+
+   replies = {}
+   feedback = feedback_matrix([first_guess], all_codes, corpus, num_colours)[0]
+   for fb in np.unique(feedback):
+      candidates = all_codes[feedback == fb]
+      guesses = representatives(candidates, corpus, [corpus[first_guess]], num_colours)
+      replies[int(fb)] = best_guess(guesses, candidates, corpus, num_colours, criterion)
+
+   return {'code_length': code_length, 'num_colours': num_colours, 'criterion': criterion,
+           'first_guess': first_guess, 'replies': replies}
+
+def load_opening_book(code_length, num_colours, criterion='miniavrg', build=True):
+   """ Returns the opening book for a board configuration, building and saving it on first use
+
+         :param code_length: the length of the code
+
+                num_colours: the number of colours
+
+                criterion: the scoring criterion of the book
+
+                build: whether to build the book if it is not on disk yet
+
+         :return: the book (see build_opening_book), or None if it is disabled in settings or not built
+   """
+
+   if not agent_settings.get('useOpeningBook', True):
+      return None
+
+   key = (code_length, num_colours, criterion)
+   if key in _loaded_books:
+      return _loaded_books[key]
+
+   path = book_path(code_length, num_colours, criterion)
+   if os.path.exists(path):
+      with open(path) as f:
+         book = json.load(f)
+      book['replies'] = {int(fb): guess for fb, guess in book['replies'].items()}
+   elif build:
+      book = build_opening_book(code_length, num_colours, criterion)
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+      tmp_path = "%s.%d.%d.tmp" % (path, os.getpid(), threading.get_ident())
+      with open(tmp_path, 'w') as f:
+         json.dump(book, f)
+      os.replace(tmp_path, path)
+   else:
+      return None
+
+   _loaded_books[key] = book
+   return book
+
+
+if __name__ == "__main__":
+
+   book = load_opening_book(game_settings['codeLength'], game_settings['numberOfColours'], agent_settings['criterion'])
+   print("Opening book for code length %d and %d colours (%d replies) is in %s" %
+         (game_settings['codeLength'], game_settings['numberOfColours'], len(book['replies']),
+          book_path(game_settings['codeLength'], game_settings['numberOfColours'], agent_settings['criterion'])))
@@ -0,0 +1,181 @@
+__author__ = "Guangjie Guo"
+__organization__ = "COSC343/AIML402, University of Otago"
+__email__ = "guo_guangjie@163.com"
+
+import time
+import functools
+
+# Phases are named blocks of code timed while profiling is enabled, nested phases forming a stack: the engine opens
+# a "move_<n>" phase around each AgentFunction call, and the agent marks the phases inside a move with phase(...)
+# or @profiled.  While profiling is disabled both cost one check of a global, so agents may keep them in.
+
+# The profiler of this process, None while profiling is disabled
+_active = None
+
+
+class _NullPhase:
+   """The phase returned while profiling is disabled, does nothing"""
+
+   def __enter__(self):
+      return self
+
+   def __exit__(self, *exc_info):
+      return False
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+
+   def __init__(self, profiler, name):
+      self.profiler = profiler
+      self.name = name
+
+   def __enter__(self):
+      self.profiler.stack.append(self.name)
+      self.start = time.perf_counter()
+      return self
+
+   def __exit__(self, *exc_info):
+      self.profiler.record(tuple(self.profiler.stack), time.perf_counter() - self.start)
+      self.profiler.stack.pop()
+      return False
+
+
+class PhaseProfiler:
+   """
+             Nested phase timings and call counts of a run, over all games and per game
+
+             ...
+
+             Attributes
+             ----------
+             totals : dict
+                 [seconds, calls] of each stack of phases (a tuple of phase names, outermost first), the seconds
+                 including those of the phases nested in it
+             games : list of dict
+                 the totals of each game, a game starting with each start_game()
+
+             Methods
+             -------
+             phase(name)
+                 Returns a context manager timing the code it runs as a phase nested in the open ones
+             start_game()
+                 Starts the totals of a new game
+             merge(other)
+                 Adds the timings of another PhaseProfiler (e.g. of a worker process) to these
+             write_collapsed(path)
+                 Writes the timings in the collapsed-stack format of flame graph tools
+             """
+
+   def __init__(self):
+      self.stack = []
+      self.totals = {}
+      self.games = []
+
+   def phase(self, name):
+      return _Phase(self, name)
+
+   def start_game(self):
+      self.games.append({})
+
+   def record(self, stack, seconds):
+      total = self.totals.setdefault(stack, [0.0, 0])
+      total[0] += seconds
+      total[1] += 1
+      if self.games:
+         total = self.games[-1].setdefault(stack, [0.0, 0])
+         total[0] += seconds
+         total[1] += 1
+
+   def merge(self, other):
+      for stack, (seconds, calls) in other.totals.items():
+         total = self.totals.setdefault(stack, [0.0, 0])
+         total[0] += seconds
+         total[1] += calls
+      self.games += other.games
+
+   def self_times(self):
+      """Returns the seconds of each stack of phases not spent in the phases nested in it"""
+
+      nested = {}
+      for stack, (seconds, _) in self.totals.items():
+         if len(stack) > 1:
+            nested[stack[:-1]] = nested.get(stack[:-1], 0.0) + seconds
+      return {stack: max(0.0, seconds - nested.get(stack, 0.0)) for stack, (seconds, _) in self.totals.items()}
+
+   def collapsed(self):
+      """Returns the lines of the collapsed-stack format: the phases of a stack joined by ';' and its self time in
+      microseconds"""
+
+      return ["%s %d" % (";".join(stack), round(seconds * 1e6))
+              for stack, seconds in sorted(self.self_times().items())]
+
+   def write_collapsed(self, path):
+      """ Writes the timings in the collapsed-stack format read by flamegraph.pl, speedscope and similar tools
+
+            :param path: the file to write, overwritten if it exists
+      """
+
+      with open(path, 'w') as f:
+         for line in self.collapsed():
+            f.write(line + "\n")
+
+   def summary(self):
+      """Returns a dictionary with the seconds, calls and mean seconds per game of each stack of phases, keyed by
+      the stack's collapsed name"""
+
+      num_games = max(len(self.games), 1)
+      return {";".join(stack): {'seconds': seconds, 'calls': calls, 'seconds_per_game': seconds / num_games}
+              for stack, (seconds, calls) in sorted(self.totals.items())}
+
+   def print_summary(self):
+      print("Agent phases (%d games):" % len(self.games))
+      print("  %-60s %10s %10s %12s" % ("phase", "calls", "total (s)", "per game (ms)"))
+      for name, stats in self.summary().items():
+         depth = name.count(";")
+         print("  %-60s %10d %10.3f %12.3f" % ("  " * depth + name.rsplit(";", 1)[-1], stats['calls'],
+                                               stats['seconds'], stats['seconds_per_game']*1e3))
+
+
+def enable():
+   """Starts profiling this process with a new PhaseProfiler and returns it"""
+
+   global _active
+   _active = PhaseProfiler()
+   return _active
+
+def disable():
+   """Stops profiling this process, returns the profiler that was active (None if there was none)"""
+
+   global _active
+   profiler, _active = _active, None
+   return profiler
+
+def active_profiler():
+   return _active
+
+def phase(name):
+   """Returns a context manager timing the code it runs as the phase name, if profiling is enabled"""
+
+   if _active is None:
+      return _NULL_PHASE
+   return _active.phase(name)
+
+def start_game():
+   if _active is not None:
+      _active.start_game()
+
+def profiled(func):
+   """Decorator timing each call of func as a phase named after it, if profiling is enabled"""
+
+   name = func.__name__
+
+   @functools.wraps(func)
+   def wrapper(*args, **kwargs):
+      if _active is None:
+         return func(*args, **kwargs)
+      with _active.phase(name):
+         return func(*args, **kwargs)
+
+   return wrapper
@@ -0,0 +1,64 @@
+__author__ = "Guangjie Guo"
+__organization__ = "COSC343/AIML402, University of Otago"
+__email__ = "guo_guangjie@163.com"
+
+import numpy as np
+
+# A guess splits the candidates into partitions by the feedback it would receive from each of them.  All the
+# criteria below only need the sizes of these partitions, and all of them give lower scores to better guesses.
+
+
+def partition_sizes(feedback, num_feedbacks):
+   """ Counts the candidates in each feedback class of each guess
+
+         :param feedback: a G x T array of encoded feedback of G guesses against T candidates
+
+                num_feedbacks: the number of distinct encoded feedback values
+
+         :return: a G x num_feedbacks int64 numpy array of partition sizes
+   """
+
+   feedback = np.atleast_2d(feedback)
+   num_guesses = len(feedback)
+   offsets = np.arange(num_guesses, dtype='int64')[:, np.newaxis] * num_feedbacks
+   counts = np.bincount((feedback + offsets).ravel(), minlength=num_guesses * num_feedbacks)
+   return counts.reshape(num_guesses, num_feedbacks)
+
+def miniavrg(counts):
+   """Expected number of candidates left after the guess"""
+
+   return np.sum(counts * counts, axis=1) / np.sum(counts, axis=1)
+
+def minimax(counts):
+   """Number of candidates left in the worst case"""
+
+   return np.max(counts, axis=1).astype('float64')
+
+def entropy(counts):
+   """Negative entropy of the feedback"""
+
+   n = np.sum(counts, axis=1, keepdims=True)
+   p = counts / n
+   with np.errstate(divide='ignore', invalid='ignore'):
+      return np.sum(np.where(counts > 0, p * np.log2(p), 0.0), axis=1)
+
+def most_parts(counts):
+   """Negative number of non-empty partitions"""
+
+   return -np.count_nonzero(counts, axis=1).astype('float64')
+
+CRITERIA = {'miniavrg': miniavrg, 'minimax': minimax, 'entropy': entropy, 'most_parts': most_parts}
+
+def partition_scores(counts, criterion='miniavrg'):
+   """ Scores guesses from their partition sizes
+
+         :param counts: a G x F array of partition sizes (see partition_sizes)
+
+                criterion: one of 'miniavrg', 'minimax', 'entropy' or 'most_parts'
+
+         :return: a G-dimensional float64 numpy array of scores, lower is better
+   """
+
+   if criterion not in CRITERIA:
+      raise ValueError("Error! Unknown scoring criterion '%s' (expecting one of %s)" % (criterion, list(CRITERIA)))
+   return CRITERIA[criterion](counts)
@@ -10,16 +10,177 @@ game_settings = {
 
    "codeLength": 5,              # length of the code to guess
 
-   "numberOfColours": 6,         # number of colours (1-6)
+   "numberOfColours": 6,         # number of colours (1-26, colours beyond the sixth are shown as plain letters)
 
    "maxNumberOfGuesses": 10,     # max. number of guesses per game
 
    "totalNumberOfGames": 100,    # total number of games played
 
+   "exhaustive": False,          # score the agent exactly against every possible code (walking its decision tree, for
+                                 # deterministic agents) instead of playing totalNumberOfGames random games
+
    "verbose": True,
 
-   "seed": None                     # seed for random choices of words in the game, None for random seed
+   "seed": None,                    # seed for random choices of words in the game, None for random seed
+
+   "numberOfWorkers": 1,         # number of processes to play the games on (1 plays them in the engine process)
+
+   "forkServer": False,          # with several workers, set up one agent in the engine process and fork the workers
+                                 # from it, so that its setup is paid once (not available on Windows)
+
+   "agentProcesses": 0,          # number of agent worker processes playing games concurrently, isolated from the
+                                 # engine (0 runs the agent in the engine process)
+
+   "moveTimeout": None,          # with agent processes, the most seconds a move may take before the agent's process
+                                 # is restarted and the move fails (None for no limit)
+
+   "batchSize": 1,               # number of games played in lockstep, for agents with AgentFunctionBatch
+
+   "metricsFile": None,          # file (.jsonl or .csv) to append per-move latency statistics of each run to, or None
+
+   "profileFile": None,          # file to write the time the agent spends in each phase of its moves to, in the
+                                 # collapsed-stack format of flame graph tools (see profiler.py), or None
+
+   "cacheDir": "cache",          # directory for precomputed tables (relative to the engine directory)
+
+   "useFeedbackTable": True,     # look up feedback in a precomputed, memory-mapped table of all code pairs
+
+   "feedbackTableMaxBytes": 256 * 2**20,  # don't build tables larger than this (6 colours, length 5 needs 60 MB)
 
 }
 
+# Settings of my_agent.py
+
+agent_settings = {
+
+   "strategy": "miniavrg",       # "miniavrg" searches for each guess, "tree" follows a precompiled strategy tree,
+                                 # "lazy" samples consistent codes without building the corpus, "lookahead" picks
+                                 # the guess leaving the fewest candidates after the best guess after it
+
+   "criterion": "miniavrg",      # how guesses are scored: "miniavrg", "minimax", "entropy" or "most_parts"
+
+   "useOpeningBook": True,       # play the first two moves from a precomputed opening book
+
+   "maxCorpusSize": 10**6,       # boards with more codes than this are played by sampling consistent codes lazily
+                                 # instead of filtering the corpus of all codes (as in the "lazy" strategy)
+
+   "lazySampleSize": 200,        # number of consistent codes sampled per move in the lazy mode
+
+   "symmetryMoves": 3,           # for this many moves only one guess per symmetry class of the game is scored
+
+   "moveDeadline": None,         # time budget of a move in seconds, guesses are scored until it runs out (None
+                                 # scores all candidates up to fullScoringMaxCandidates and races them beyond);
+                                 # filtering the candidates isn't budgeted, so moves may overrun it by that time
+
+   "fullScoringMaxCandidates": 10000,  # moves with more candidates than this race guesses on growing samples of the
+                                       # candidates, for the time of scoring 100 guesses on all of them
+
+   "scoringMemoryBytes": 64 * 2**20,   # memory for scoring guesses, they are scored in chunks that fit in it
+
+   "lookaheadBudget": 1.0,       # in "lookahead" strategy, seconds per move after which no more guesses are looked
+                                 # ahead from (the best one by the criterion always is)
+
+   "lookaheadMaxCandidates": 1000,  # in "lookahead" strategy, moves with more candidates are searched as in "miniavrg"
+
+   "candidateIndexBytes": 32 * 2**20,  # memory for bitsets of the codes giving each feedback to the guesses played
+                                       # most, candidates are filtered by them (None or 0 disables the index)
+
+   "candidateIndexMinScans": 2,  # a guess is indexed once filtering by it has scanned this many corpora of codes
+
+   "historyCacheBytes": 64 * 2**20,  # memory for caching the guess and candidates of each game history met, so
+                                    # games repeating a history look them up (None or 0 disables the cache)
+
+   "shareWarmState": True,       # agents of the same process and board share their corpus, opening book, strategy
+                                 # tree and history cache, built by the first of them on its first move
+
+}
+
+# Settings of benchmark.py
+
+benchmark_settings = {
+
+   "agentFiles": ["my_agent.py", "random_agent.py"],   # agents to benchmark
+
+   "codeLengths": [4, 5],        # code lengths to benchmark
+
+   "numbersOfColours": [4, 6],   # numbers of colours to benchmark
+
+   "maxNumberOfGuesses": 10,     # max. number of guesses per game
+
+   "numberOfGames": 100,         # number of games played for each agent and board
+
+   "seed": 0,                    # seed of the targets, fixed so that runs are comparable
+
+   "baselineFile": "benchmark_baseline.json",   # results to compare with (saved with --save-baseline)
+
+   "resultsFile": "benchmark_results.jsonl",    # file to append the results of every benchmark run to
+
+   "regressionThreshold": 0.2,   # flag latencies and memory more than this fraction worse than the baseline
 
+   "scoreThreshold": 0.0,        # flag average scores more than this much worse (higher) than the baseline, the
+                                 # targets and agents' random generators are seeded so scores are reproducible
+
+}
+
+# Settings of tournament.py
+
+tournament_settings = {
+
+   "agentFiles": ["my_agent.py", "random_agent.py"],   # agents taking part
+
+   "codeLength": 5,              # length of the code to guess
+
+   "numberOfColours": 6,         # number of colours
+
+   "maxNumberOfGuesses": 10,     # max. number of guesses per game
+
+   "numberOfGames": 100,         # number of games every agent plays, against the same targets
+
+   "seed": None,                 # seed of the targets (None picks one from the time, it is saved with the results)
+
+   "agentProcesses": 1,          # number of worker processes of each agent
+
+   "moveTimeout": 10.0,          # the most seconds a move may take, the game is given up when it takes longer
+
+   "resultsFile": None,          # file to append the leaderboard of every tournament to, or None
+
+}
+
+# Settings of game_server.py
+
+server_settings = {
+
+   "socketPath": None,           # Unix socket to serve on, None serves on localhost TCP
+
+   "host": "127.0.0.1",          # address and port of the TCP server
+   "port": 8343,
+
+   "agentThreads": 4,            # number of threads running hosted agents' constructors and moves
+
+   "maxSessions": 1000,          # the most sessions open at a time
+
+   "moveTimeout": 10.0,          # the most seconds a hosted agent may take for a move, None for no limit
+
+   "idleTimeout": 600.0,         # sessions without requests for this many seconds are ended, None to keep them
+
+}
+
+# Settings of load_test.py
+
+load_settings = {
+
+   "agentFile": "my_agent.py",   # agent the server hosts in every session
+
+   "codeLength": 5,              # length of the code to guess
+
+   "numberOfColours": 6,         # number of colours
+
+   "maxNumberOfGuesses": 10,     # max. number of guesses per game
+
+   "numberOfSessions": 200,      # number of sessions played
+
+   "concurrency": 16,            # number of sessions played at the same time
+
+   "useRunningServer": False,    # load the server at server_settings' address instead of one started in-process
+
+}
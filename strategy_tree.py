@@ -0,0 +1,123 @@
+__author__ = "Guangjie Guo"
+__organization__ = "COSC343/AIML402, University of Otago"
+__email__ = "guo_guangjie@163.com"
+
+import os
+import threading
+import numpy as np
+from mastermind import encode_feedback, num_feedbacks
+from feedback_table import cache_dir
+from opening_book import load_opening_book, best_guess
+from settings import game_settings, agent_settings
+
+# The strategy tree maps the sequence of feedbacks received so far to the next guess.  A sequence is keyed by
+# the integer path_key(...) builds, the empty sequence (first guess) having key 0.
+
+# Trees already loaded by this process, keyed by (code_length, num_colours, criterion)
+_loaded_trees = {}
+
+
+def path_key(key, feedback, code_length):
+   """Returns the key of the sequence of feedbacks keyed by key followed by feedback"""
+
+   return key * num_feedbacks(code_length) + feedback + 1
+
+def tree_path(code_length, num_colours, criterion='miniavrg'):
+   return os.path.join(cache_dir(), "strategy_L%d_C%d_%s.npz" % (code_length, num_colours, criterion))
+
+def compile_strategy_tree(code_length, num_colours, criterion='miniavrg'):
+   """ Walks the whole game tree of the strategy that plays the best guess under criterion (see scoring.py)
+
+         Every node scores all its candidates against each other (no sampling), so the tree is the deterministic
+         version of MastermindAgent's search.  The first two moves come from the opening book when it is
+         enabled.
+
+         :return: a dictionary mapping the key of every feedback sequence the strategy can meet to the corpus
+                  index of its guess
+   """
+
+   from my_agent import gen_corpus, feedback_matrix
+   from symmetry import representatives
+
+   corpus = gen_corpus(range(num_colours), code_length)
+   all_codes = np.arange(len(corpus), dtype='int32')
+   solved = encode_feedback(code_length, 0, code_length)
+   book = load_opening_book(code_length, num_colours, criterion)
+
+   tree = {}
+   if book is not None:
+      first_guess = book['first_guess']
+   else:
+      first_guess = best_guess(all_codes, all_codes, corpus, num_colours, criterion)
+
+   # Depth-first walk over (key, candidates, guess, guesses played before) nodes
+   stack = [(0, all_codes, first_guess, [])]
+   while stack:
+      key, candidates, guess, history = stack.pop()
+      tree[key] = guess
+      history = history + [guess]
+
+      feedback = feedback_matrix([guess], candidates, corpus, num_colours)[0]
+      for fb in np.unique(feedback):
+         if fb == solved:
+            continue
+         child_candidates = candidates[feedback == fb]
+         if key == 0 and book is not None:
+            child_guess = book['replies'][int(fb)]
+         else:
+            guesses = child_candidates
+            if len(history) < agent_settings.get('symmetryMoves', 0):
+               guesses = representatives(child_candidates, corpus, corpus[history], num_colours)
+            child_guess = best_guess(guesses, child_candidates, corpus, num_colours, criterion)
+         stack.append((path_key(key, int(fb), code_length), child_candidates, child_guess, history))
+
+   return tree
+
+def save_strategy_tree(tree, path):
+   """Saves a tree as two parallel arrays of sorted keys and int32 guesses in a .npz file"""
+
+   keys = np.array(sorted(tree), dtype='int64')
+   guesses = np.array([tree[k] for k in keys], dtype='int32')
+   os.makedirs(os.path.dirname(path), exist_ok=True)
+   tmp_path = "%s.%d.%d.tmp.npz" % (path[:-4], os.getpid(), threading.get_ident())
+   np.savez_compressed(tmp_path, keys=keys, guesses=guesses)
+   os.replace(tmp_path, path)
+
+def load_strategy_tree(code_length, num_colours, criterion='miniavrg', build=True):
+   """ Returns the strategy tree for a board configuration, compiling and saving it on first use
+
+         :param code_length: the length of the code
+
+                num_colours: the number of colours
+
+                criterion: the scoring criterion of the strategy
+
+                build: whether to compile the tree if it is not on disk yet
+
+         :return: the tree (see compile_strategy_tree), or None if it is not compiled
+   """
+
+   key = (code_length, num_colours, criterion)
+   if key in _loaded_trees:
+      return _loaded_trees[key]
+
+   path = tree_path(code_length, num_colours, criterion)
+   if os.path.exists(path):
+      with np.load(path) as data:
+         tree = dict(zip(data['keys'].tolist(), data['guesses'].tolist()))
+   elif build:
+      tree = compile_strategy_tree(code_length, num_colours, criterion)
+      save_strategy_tree(tree, path)
+   else:
+      return None
+
+   _loaded_trees[key] = tree
+   return tree
+
+
+if __name__ == "__main__":
+
+   tree = load_strategy_tree(game_settings['codeLength'], game_settings['numberOfColours'], agent_settings['criterion'])
+   print("Strategy tree for code length %d and %d colours (%d nodes) is in %s" %
+         (game_settings['codeLength'], game_settings['numberOfColours'], len(tree),
+          tree_path(game_settings['codeLength'], game_settings['numberOfColours'], agent_settings['criterion'])))
@@ -0,0 +1,110 @@
+__author__ = "Guangjie Guo"
+__organization__ = "COSC343/AIML402, University of Otago"
+__email__ = "guo_guangjie@163.com"
+
+import itertools
+import numpy as np
+from mastermind import code_indices
+from profiler import profiled
+
+# Renaming colours that no guess has used yet, and permuting positions in a way that leaves every guess played
+# so far unchanged, maps the set of codes consistent with the game onto itself and preserves feedback.  Two
+# guesses related by such a symmetry therefore split the candidates into partitions of the same sizes, and only
+# one guess of each class needs to be scored.
+
+
+def position_classes(history_codes, code_length):
+   """Groups the positions that every guess so far has the same colour in, returns a list of lists of positions"""
+
+   classes = []
+   for p in range(code_length):
+      for positions in classes:
+         if all(code[positions[0]] == code[p] for code in history_codes):
+            positions.append(p)
+            break
+      else:
+         classes.append([p])
+   return classes
+
+def position_permutations(history_codes, code_length, max_permutations):
+   """Returns the position permutations that leave every guess so far unchanged, just the identity if there are
+   more than max_permutations of them"""
+
+   classes = position_classes(history_codes, code_length)
+   count = int(np.prod([np.prod(range(1, len(positions) + 1)) for positions in classes]))
+   if count > max_permutations:
+      return [list(range(code_length))]
+
+   permutations = []
+   for per_class in itertools.product(*[itertools.permutations(positions) for positions in classes]):
+      permutation = [0] * code_length
+      for positions, permuted in zip(classes, per_class):
+         for p, q in zip(positions, permuted):
+            permutation[p] = q
+      permutations.append(permutation)
+   return permutations
+
+def canonical_forms(codes, history_codes, num_colours, max_permutations=720):
+   """ Returns an identifier of the symmetry class of each code
+
+         :param codes: an N x L numpy array of integer-encoded codes
+
+                history_codes: the integer-encoded guesses played so far (an empty list at the start)
+
+                num_colours: the number of colours
+
+                max_permutations: only the colour symmetry is used when more position permutations than this
+                                  leave the history unchanged
+
+         :return: an N-dimensional int64 array, equal for two codes exactly when they are symmetric (the index of
+                  the smallest code of the class)
+   """
+
+   codes = np.atleast_2d(codes)
+   used = np.zeros(num_colours, dtype=bool)
+   for code in history_codes:
+      used[np.asarray(code)] = True
+   free_colours = np.flatnonzero(~used)
+   rows = np.arange(len(codes))
+
+   canonical = None
+   for permutation in position_permutations(history_codes, codes.shape[1], max_permutations):
+      permuted = codes[:, permutation]
+
+      # Rename the free colours in order of first appearance to the free colours in increasing order
+      renamed = permuted.copy()
+      mapping = np.full((len(codes), num_colours), -1, dtype='int64')
+      next_free = np.zeros(len(codes), dtype='int64')
+      for p in range(codes.shape[1]):
+         colour = permuted[:, p]
+         is_free = ~used[colour]
+         is_new = is_free & (mapping[rows, colour] < 0)
+         mapping[rows[is_new], colour[is_new]] = free_colours[next_free[is_new]]
+         next_free += is_new
+         renamed[is_free, p] = mapping[rows[is_free], colour[is_free]]
+
+      indices = code_indices(renamed, num_colours)
+      canonical = indices if canonical is None else np.minimum(canonical, indices)
+
+   return canonical
+
+@profiled
+def representatives(guesses, corpus, history_codes, num_colours):
+   """ Keeps one guess of each symmetry class, the first one in the order of guesses
+
+         Since the first guess with the lowest score is kept, picking the best guess from the representatives
+         gives the same guess as picking it from all of them.
+
+         :param guesses: array of corpus indices of guesses
+
+                corpus: the corpus of all codes
+
+                history_codes: the integer-encoded guesses played so far
+
+         :return: array of the corpus indices of the representatives, in the order of guesses
+   """
+
+   if len(guesses) == 0:
+      return guesses
+   _, first = np.unique(canonical_forms(corpus[guesses], history_codes, num_colours), return_index=True)
+   return guesses[np.sort(first)]
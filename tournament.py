@@ -0,0 +1,122 @@
+__author__ = "Guangjie Guo"
+__organization__ = "COSC343/AIML402, University of Otago"
+__email__ = "guo_guangjie@163.com"
+
+import json
+import time
+import concurrent.futures
+import numpy as np
+from mastermind import MastermindGame
+from metrics import RunMetrics
+from agent_worker import AgentPool
+from settings import tournament_settings
+
+# Number of error messages kept for each agent in the leaderboard
+MAX_ERRORS_REPORTED = 5
+
+
+def play_agent(agent_file, code_length, num_colours, num_guesses, targets, seeds, seed, agent_processes,
+               move_timeout):
+   """ Plays one agent of a tournament on its own agent processes (see agent_worker.py)
+
+         :return: the agent's leaderboard entry, a dictionary with its average score, latency statistics, the number
+                  of errors and the first few of them; the average score is None if the agent couldn't be started
+   """
+
+   game = MastermindGame(code_length=code_length, num_colours=num_colours, tournament=True)
+   game.metrics = RunMetrics()
+   game.colours = np.array(game.colours)
+   game.load_feedback_table()
+
+   entry = {'agent': agent_file, 'average_score': None, 'games': 0, 'restarts': 0}
+   try:
+      pool = AgentPool(agent_file, code_length, list(game.colours), num_guesses, agent_processes, seed=seed,
+                       timeout=move_timeout)
+   except Exception as e:
+      game.errors.append(str(e))
+   else:
+      with pool:
+         for player in pool.players:
+            game.metrics.record_init(player.init_time)
+         try:
+            for score, game_time in game.play_games_remote(pool, targets, seeds, num_guesses):
+               game.metrics.record_game(score, game_time)
+         except Exception as e:
+            # An error of the engine stops this agent's games, the games it didn't play count as given up
+            game.errors.append(str(e))
+            for _ in range(len(targets) - len(game.metrics.scores)):
+               game.metrics.record_game(num_guesses * 2, 0.0)
+      entry['average_score'] = float(np.mean(game.metrics.scores))
+      entry['games'] = len(game.metrics.scores)
+      entry['restarts'] = sum(player.agent.restarts for player in pool.players)
+
+   summary = game.metrics.summary()
+   entry['move_p50'] = summary['all_moves'].get('p50')
+   entry['move_p95'] = summary['all_moves'].get('p95')
+   entry['init_time'] = summary['init'].get('mean')
+   entry['errors'] = len(game.errors)
+   entry['error_messages'] = game.errors[:MAX_ERRORS_REPORTED]
+   return entry
+
+def run_tournament(agent_files, code_length, num_colours, num_guesses, num_games, seed, agent_processes=1,
+                   move_timeout=None):
+   """ Plays every agent against the same targets, all agents at the same time
+
+         :param agent_files: the agents taking part
+
+                agent_processes: number of worker processes of each agent
+
+                move_timeout: the most seconds a move may take, a move taking longer fails (None for no limit)
+
+         :return: the leaderboard, a list of the entries of play_agent sorted by average score (lowest first), the
+                  agents that couldn't be started last
+
+         The targets and game seeds come from the tournament seed, so every agent plays the same games.  An agent
+         failing (not starting, crashing, timing out or raising) gives up the games it fails in, and the errors
+         are counted in its entry without stopping the tournament.
+   """
+
+   targets, seeds = MastermindGame(code_length=code_length, num_colours=num_colours).gen_targets(num_games, seed)
+
+   with concurrent.futures.ThreadPoolExecutor(max_workers=len(agent_files)) as executor:
+      entries = list(executor.map(lambda agent_file: play_agent(agent_file, code_length, num_colours, num_guesses,
+                                                                targets, seeds, seed, agent_processes,
+                                                                move_timeout), agent_files))
+
+   return sorted(entries, key=lambda entry: (entry['average_score'] is None, entry['average_score'] or 0.0))
+
+def print_leaderboard(leaderboard):
+   print("%4s %-28s %8s %6s %10s %10s %10s %7s" % ("", "agent", "score", "games", "p50 (ms)", "p95 (ms)", "init (ms)",
+                                                  "errors"))
+   for rank, entry in enumerate(leaderboard):
+      if entry['average_score'] is None:
+         print("%4s %-28s %8s %6d %10s %10s %10s %7d" % ("-", entry['agent'], "failed", 0, "", "", "",
+                                                         entry['errors']))
+      else:
+         print("%4d %-28s %8.3f %6d %10.3f %10.3f %10.1f %7d" % (rank + 1, entry['agent'], entry['average_score'],
+                                                                 entry['games'], entry['move_p50']*1e3,
+                                                                 entry['move_p95']*1e3, entry['init_time']*1e3,
+                                                                 entry['errors']))
+      for message in entry['error_messages']:
+         print("        %s" % message)
+
+
+if __name__ == "__main__":
+
+   seed = tournament_settings['seed']
+   if seed is None:
+      seed = int(time.time())
+
+   leaderboard = run_tournament(tournament_settings['agentFiles'], tournament_settings['codeLength'],
+                                tournament_settings['numberOfColours'], tournament_settings['maxNumberOfGuesses'],
+                                tournament_settings['numberOfGames'], seed, tournament_settings['agentProcesses'],
+                                tournament_settings['moveTimeout'])
+   print_leaderboard(leaderboard)
+
+   if tournament_settings['resultsFile'] is not None:
+      with open(tournament_settings['resultsFile'], 'a') as f:
+         f.write(json.dumps({'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'seed': seed,
+                             'codeLength': tournament_settings['codeLength'],
+                             'numberOfColours': tournament_settings['numberOfColours'],
+                             'numberOfGames': tournament_settings['numberOfGames'],
+                             'leaderboard': leaderboard}) + "\n")